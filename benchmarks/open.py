@@ -0,0 +1,63 @@
+#! /usr/bin/python3
+
+"""Compare the read throughput of BaseAction.open, iter_records and iter_blocks with the built-in open, for plain and compressed files.
+
+Run from this folder: python3 open.py [megabytes]
+"""
+
+import gzip
+import bz2
+import contextlib
+import lzma
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+from hydra import *
+
+def lines(f):
+	"""Read the file one line at a time and return the number of lines."""
+	count = 0
+	for line in f: count += 1
+	return count
+
+def block_lines(blocks):
+	"""Yield the number of lines in each block."""
+	for block in blocks: yield bytes(block).count(b"\n")
+
+def run(opener, filename, size):
+	"""Return the throughput in MB/s of the uncompressed data."""
+	started = time.perf_counter()
+	with opener(filename) as f: lines(f)
+	return size / (time.perf_counter() - started) / 1e6
+
+if __name__ == "__main__":
+	megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+	folder = tempfile.mkdtemp()
+	try:
+		line = b"2024-05-05 12:00:00 INFO request handled in 12 ms from 192.168.0.1\n"
+		data = line * (megabytes * 1000000 // len(line))
+		plain = os.path.join(folder, "data.log")
+		with open(plain, "wb") as f: f.write(data)
+		files = [("plain", plain, open)]
+		for (extension, module) in ((".gz", gzip), (".bz2", bz2), (".xz", lzma)):
+			with module.open(plain + extension, "wb") as f: f.write(data)
+			files.append((extension, plain + extension, lambda filename, module=module: module.open(filename, "rt", encoding="utf-8")))
+
+		action = BaseAction({})
+		print("{:<8} {:<24} {:>10}".format("File", "Method", "MB/s"))
+		for (name, filename, opener) in files:
+			for (method, function) in (
+				("built-in (text)", opener),
+				("BaseAction.open (text)", lambda filename: action.open(filename)),
+				("BaseAction.open (1 MB)", lambda filename: action.open(filename, buffering=1 << 20)),
+				("BaseAction.open (bytes)", lambda filename: action.open(filename, "rb", buffering=1 << 20)),
+				("BaseAction.iter_records", lambda filename: contextlib.nullcontext(action.iter_records(filename))),
+				("BaseAction.iter_blocks", lambda filename: contextlib.nullcontext(block_lines(action.iter_blocks(filename))))
+			):
+				print("{:<8} {:<24} {:>10.1f}".format(name, method, run(function, filename, len(data))))
+	finally:
+		shutil.rmtree(folder)
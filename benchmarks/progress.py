@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+
+"""Compare the per-item cost of calling the progress callback with ProgressTracker.add.
+
+Run from this folder: python3 progress.py [count]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+from hydra import *
+
+program = {"name":"Benchmark", "version":"", "date":"", "purpose":"", "url":None, "copyright":"", "license":None, "config":None, "error":None}
+
+class CLI(BaseCLI):
+	"""CLI whose progress output goes to os.devnull."""
+	def define_arguments(self):
+		self.arguments = [
+			("help"   , "h", "", "boolean"),
+			("version", "V", "", "boolean"),
+			("license", "l", "", "boolean"),
+			("quiet"  , "q", "", "boolean"),
+			("verbose", "v", "", "boolean")
+		]
+	
+	def action(self):
+		pass
+
+class PerCall(BaseAction):
+	def action(self):
+		count = self.inputs["count"]
+		started = time.time()
+		for i in range(count): self.progress("Record", started, i + 1, count)
+
+class PerCallBytes(BaseAction):
+	def action(self):
+		count = self.inputs["count"]
+		started = time.time()
+		for i in range(count): self.progress("Record", started, i + 1, count, (i + 1) * 100, count * 100)
+
+class Tracker(BaseAction):
+	def action(self):
+		count = self.inputs["count"]
+		with self.tracker("Record", count) as t:
+			for i in range(count): t.add()
+
+class TrackerBytes(BaseAction):
+	def action(self):
+		count = self.inputs["count"]
+		with self.tracker("Record", count, count * 100) as t:
+			for i in range(count): t.add(1, 100)
+
+class Empty(BaseAction):
+	def action(self):
+		count = self.inputs["count"]
+		for i in range(count): pass
+
+def run(action, count):
+	with open(os.devnull, "w") as devnull:
+		cli = CLI(program, {}, [], stdout=devnull)
+		started = time.perf_counter()
+		action({"count":count}, cli.output_progress).execute()
+		return time.perf_counter() - started
+
+if __name__ == "__main__":
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+	baseline = run(Empty, count)
+	print("{:<32} {:>12}".format("Method", "ns/item"))
+	for (name, action) in (("self.progress(...)", PerCall), ("self.progress(...) with bytes", PerCallBytes), ("ProgressTracker.add()", Tracker), ("ProgressTracker.add(1, n)", TrackerBytes)):
+		seconds = run(action, count) - baseline
+		print("{:<32} {:>12.0f}".format(name, seconds / count * 1e9))
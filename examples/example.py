@@ -13,7 +13,10 @@ program = {
 	"copyright":"Copyright © YYYY Your Name, All Rights Reserved.",
 	"license"  :"This program is free software: you can redistribute it and/or modify\nit under the terms of the GNU General Public License as published by\nthe Free Software Foundation, either version 3 of the License, or\n(at your option) any later version.\n\nThis program is distributed in the hope that it will be useful,\nbut WITHOUT ANY WARRANTY; without even the implied warranty of\nMERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the\nGNU General Public License for more details.\n\nYou should have received a copy of the GNU General Public License\nalong with this program.  If not, see <http://www.gnu.org/licenses/>.", # None for no license
 	"config"   :"{path}example.ini", # None for no config file
-	"error"    :"{path}example.err" # None for no error file
+	"error"    :"{path}example.err", # None for no error file
+	"state"    :None, # "{path}example.db" to skip unchanged inputs (see BaseAction.changed), None for no state file
+	"cache"    :None, # "{path}cache" to cache the results of cacheable actions, None for no cache
+	"config-cache":None # "{path}example.cfgc" to cache the parsed configuration files, None for no cache
 }
 
 class Configuration(BaseConfiguration):
@@ -77,6 +80,7 @@ class CLI(BaseCLI):
 			#("long-name", "char", "Description", "boolean")
 			#("long-name", "char", "Description", "value")
 			#("long-name", "char", "Description", "multiple")
+			#("long-name", "char", "Description", "value", int, True) # converted to int and required
 		]
 		
 		# Flags used: g, h, l, n, q, v, V
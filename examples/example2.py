@@ -35,7 +35,17 @@ class Action3(BaseAction):
 	def action(self):
 		return "Action 3 Completed Successfully"
 
+# Actions in other modules are declared as "module:Class" and only imported when they are performed, i.e.:
+#	actions.register("action4", "example2_actions:Action4", "Action 4")
+actions = ActionRegistry()
+actions.register("action1", Action1, "Action 1")
+actions.register("action2", Action2, "Action 2")
+actions.register("action3", Action3, "Action 3")
+
 class CLI(BaseCLI):
+	# Adds the required --action argument and selects the action
+	registry = actions
+	
 	def define_arguments(self):
 		self.arguments = [
 			("help"    , "h", "Show help information"              , "boolean"),
@@ -43,7 +53,7 @@ class CLI(BaseCLI):
 			("license" , "l", "Show license information"           , "boolean"),
 			("quiet"   , "q", "Suppress all output"                , "boolean"),
 			("verbose" , "v", "Enable verbose output"              , "boolean"),
-			("action"  , "a", "One of: action1, action2 or action3", "value"),
+			("action"  , "a", "One of: action1, action2 or action3", "value"), # Choices from the registry
 			("value1"  , "1", "Value #1"                           , "value"),
 			("value2"  , "2", "Value #2"                           , "value"),
 			("value3"  , "3", "Value #3"                           , "value")
@@ -51,41 +61,22 @@ class CLI(BaseCLI):
 	
 	def define_usage(self):
 		self.usage = "example2 [-options] --action action# --value# value"
-	
-	def get_action(self, inputs):
-		if inputs["action"] == "action1":
-			return Action1
-		elif inputs["action"] == "action2":
-			return Action2
-		elif inputs["action"] == "action3":
-			return Action3
-		else:
-			raise Exception("action required")
 
 class GUI(BaseGUI):
+	# Selects the action of the current tab
+	registry = actions
+	
 	def create_widgets(self):
-		notebook = self.create_notebook(self, "action")
-		
-		tab1 = self.create_tab(notebook, "Action 1")
-		self.create_entry(tab1, "value1" , "Value 1")
-		self.create_button(tab1, "submit1", "Action 1", self.action)
-		
-		tab2 = self.create_tab(notebook, "Action 2")
-		self.create_entry(tab2, "value2" , "Value 2")
-		self.create_button(tab2, "submit2", "Action 2", self.action)
-		
-		tab3 = self.create_tab(notebook, "Action 3")
-		self.create_entry(tab3, "value3" , "Value 3")
-		self.create_button(tab3, "submit3", "Action 3", self.action)
-
-	def get_action(self, inputs):
-		if inputs["action"] == "Action 1":
-			return Action1
-		elif inputs["action"] == "Action 2":
-			return Action2
-		elif inputs["action"] == "Action 3":
-			return Action3
-		else:
-			raise Exception("An unknown error has occured")
+		# Adds a tab for each action, with the widgets from create_{name}_tab
+		self.create_actions(self)
+	
+	def create_action1_tab(self, tab):
+		self.create_entry(tab, "value1", "Value 1")
+	
+	def create_action2_tab(self, tab):
+		self.create_entry(tab, "value2", "Value 2")
+	
+	def create_action3_tab(self, tab):
+		self.create_entry(tab, "value3", "Value 3")
 
 if __name__ == "__main__": main(program, None, CLI, GUI)
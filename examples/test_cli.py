@@ -0,0 +1,204 @@
+#! /usr/bin/python3
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import hydra
+from hydra import *
+
+program = {"name":"Test", "version":"0.0.0", "date":"", "purpose":"", "url":None, "copyright":"", "license":None, "config":None, "error":None}
+
+class Greet(BaseAction):
+	def action(self):
+		if self.inputs["name"] == "nobody": raise ValueError("Nobody to greet")
+		return "Hello {}!".format(self.inputs["name"])
+
+class Expand(BaseAction):
+	def action(self):
+		self.expand("input")
+		return list(self.iexpand("other"))
+
+class CLI(BaseCLI):
+	def define_arguments(self):
+		self.arguments = [
+			("help"   , "h", "Show help information"   , "boolean"),
+			("version", "V", "Show version information", "boolean"),
+			("license", "l", "Show license information", "boolean"),
+			("quiet"  , "q", "Suppress all output"     , "boolean"),
+			("verbose", "v", "Enable verbose output"   , "boolean"),
+			("name"   , "n", "A name"                  , "value")
+		]
+	
+	def get_action(self, inputs):
+		return Greet
+
+class Parser(CLI):
+	def define_arguments(self):
+		self.arguments = [
+			("help"   , "h", "Show help information"   , "boolean"),
+			("version", "V", "Show version information", "boolean"),
+			("license", "l", "Show license information", "boolean"),
+			("quiet"  , "q", "Suppress all output"     , "boolean"),
+			("verbose", "v", "Enable verbose output"   , "boolean"),
+			("count"  , "c", "Count"                   , "value", int, True),
+			("ratio"  , "r", "Ratio"                   , "value", float),
+			("dry-run", "d", "Dry run"                 , "value", bool),
+			("output" , "o", "Output"                  , "value", "path"),
+			("mode"   , "m", "Mode"                    , "value", ("fast", "slow")),
+			("tags"   , "t", "Tags"                    , "value", "list"),
+			("files"  , "f", "Files"                   , "multiple", int)
+		]
+	
+	def action(self):
+		# Only parse the arguments
+		pass
+
+class TestArguments(unittest.TestCase):
+	def parse(self, argv, conf={}):
+		return Parser(program, conf, ["test"] + argv, stdout=io.StringIO()).inputs
+	
+	def test_coercion(self):
+		inputs = self.parse(["-c", "3", "--ratio=0.5", "-d", "yes", "-o", "~/out.txt", "-m", "slow", "-t", "a, b,c", "-f", "1", "2", "--workers", "4", "--watch-interval", "0.5"])
+		self.assertEqual(inputs["count"], 3)
+		self.assertEqual(inputs["ratio"], 0.5)
+		self.assertIs(inputs["dry-run"], True)
+		self.assertEqual(inputs["output"], os.path.expanduser("~/out.txt"))
+		self.assertEqual(inputs["mode"], "slow")
+		self.assertEqual(inputs["tags"], ["a", "b", "c"])
+		self.assertEqual(inputs["files"], [1, 2])
+		self.assertEqual(inputs["workers"], 4)
+		self.assertEqual(inputs["watch-interval"], 0.5)
+		self.assertEqual(inputs["progress-format"], None)
+	
+	def test_defaults(self):
+		conf = {"ratio":"0.25", "files":"7", "count":"2"}
+		inputs = self.parse([], conf)
+		self.assertEqual((inputs["count"], inputs["ratio"], inputs["files"], inputs["mode"]), (2, 0.25, [7], None))
+		
+		# The configuration isn't modified
+		self.assertEqual(conf, {"ratio":"0.25", "files":"7", "count":"2"})
+		inputs["files"].append(8)
+		self.assertEqual(self.parse([], conf)["files"], [7])
+	
+	def test_errors(self):
+		for (argv, error) in (
+			(["-c", "x"], "^Invalid value for --count: x "),
+			(["-c", "1", "-m", "medium"], "^Invalid value for --mode: medium \\(expected one of: fast, slow\\)$"),
+			(["-c", "1", "-d", "maybe"], "^Invalid value for --dry-run: maybe \\(expected yes or no\\)$"),
+			(["-c", "1", "--workers", "abc"], "^Invalid value for --workers: abc "),
+			(["-c", "1", "--workers", "0"], "^Invalid value for --workers: 0 \\(must be at least 1\\)$"),
+			(["-c", "1", "--watch-interval", "x"], "^Invalid value for --watch-interval: x "),
+			(["-c", "1", "--progress-format", "xml"], "^Invalid value for --progress-format: xml "),
+			(["-c", "1", "--bogus"], "^Unknown argument: bogus$")
+		):
+			with self.assertRaisesRegex(ValueError, error):
+				self.parse(argv)
+	
+	def test_required(self):
+		with self.assertRaisesRegex(ValueError, "^Missing required argument: --count$"):
+			self.parse(["-r", "1"])
+		self.assertEqual(self.parse(["--help"])["count"], None)
+	
+	def test_spec(self):
+		spec = Parser(program, {}, ["test", "-c", "1"], stdout=io.StringIO()).spec
+		self.assertIs(Parser(program, {}, ["test", "-c", "2"], stdout=io.StringIO()).spec, spec)
+		with self.assertRaises(AttributeError):
+			spec.required = ()
+		
+		for (arguments, error) in (
+			([("tags", "t", "Tags", "multiple", "list")], "^Multiple arguments are already lists"),
+			([("a", "a", "A", "boolean"), ("a", "b", "B", "boolean")], "^Duplicate argument: --a$"),
+			([("a", "a", "A", "boolean"), ("b", "a", "B", "boolean")], "^Duplicate argument: -a$"),
+			([("a", "a", "A", "flag")], "^Invalid argument type: flag$")
+		):
+			with self.assertRaisesRegex(ValueError, error):
+				ArgumentSpec(arguments)
+
+class TestServe(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.folder = tempfile.mkdtemp()
+		cls.path = os.path.join(cls.folder, "server.sock")
+		
+		# The server runs until the process exits
+		thread = threading.Thread(target=CLI, args=(program, {}, ["test", "--serve", cls.path, "--workers", "2"]), kwargs={"stdout":io.StringIO()}, daemon=True)
+		thread.start()
+		for i in range(100):
+			if os.path.exists(cls.path): break
+			time.sleep(0.05)
+	
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.folder)
+	
+	def send(self, argv):
+		stdout = io.StringIO()
+		connect(self.path, argv, stdout=stdout)
+		return stdout.getvalue()
+	
+	def test_job(self):
+		self.assertIn("Hello World!", self.send(["--name", "World"]))
+		self.assertIn("Hello Again!", self.send(["-n", "Again"]))
+	
+	def test_argument_error(self):
+		self.assertIn("ERROR:\nUnknown argument: bogus", self.send(["--bogus"]))
+	
+	def test_rejected(self):
+		nested = os.path.join(self.folder, "nested.sock")
+		self.assertIn("ERROR:\n--serve can't be used in a job sent to a server", self.send(["--serve", nested]))
+		self.assertFalse(os.path.exists(nested))
+		self.assertIn("--watch can't be used", self.send(["--watch", "-n", "x"]))
+		self.assertIn("--batch can't be used", self.send(["--batch", "jobs.txt"]))
+		
+		# The server still runs jobs
+		self.assertIn("Hello World!", self.send(["--name", "World"]))
+	
+	def test_no_server(self):
+		with self.assertRaisesRegex(ConnectionError, "^Can't connect to the server on "):
+			connect(os.path.join(self.folder, "missing.sock"), [])
+
+class TestBatch(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.batch = os.path.join(self.folder, "jobs.txt")
+		with open(self.batch, "w") as f: f.write("-n World\n-n nobody\n")
+	
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+	
+	def test_errors(self):
+		# Failed jobs are written to the error file with or without a process pool
+		for workers in ("1", "2"):
+			error = os.path.join(self.folder, "error{}.txt".format(workers))
+			stdout = io.StringIO()
+			CLI({**program, "error":error}, {}, ["test", "--batch", self.batch, "--workers", workers], stdout=stdout)
+			self.assertIn("Job 1: OK", stdout.getvalue())
+			self.assertIn("Job 2: ERROR", stdout.getvalue())
+			self.assertIn("2 jobs, 1 succeeded, 1 failed", stdout.getvalue())
+			with open(error, "r") as f: self.assertIn("ValueError: Nobody to greet", f.read())
+
+class TestWatch(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		os.makedirs(os.path.join(self.folder, "d", "e"))
+		for name in ("z.txt", os.path.join("e", "y.txt")):
+			with open(os.path.join(self.folder, "d", name), "w") as f: f.write(name)
+	
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+	
+	def test_snapshot(self):
+		# The snapshot matches the files found by expand (glob) and iexpand (recursive **)
+		pattern = os.path.join(self.folder, "d", "**", "*.txt")
+		action = Expand({"input":pattern, "other":pattern}, interface="test")
+		found = action.execute()
+		snapshot = hydra._snapshot(action.watched)
+		self.assertEqual(sorted(snapshot["input"]), sorted(action.inputs["input"]))
+		self.assertEqual(sorted(snapshot["other"]), sorted(found))
+		self.assertEqual(len(found), 2)
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,106 @@
+#! /usr/bin/python3
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from hydra import *
+
+class Configuration(BaseConfiguration):
+	env_prefix = "TST_"
+	
+	def define_layers(self):
+		return [os.path.join(self.prog["folder"], "defaults.ini"), os.path.join(self.prog["folder"], "missing.ini"), os.path.join(self.prog["folder"], "user.ini")]
+	
+	def validate(self):
+		if self.conf.get("width", "") == "": raise ValueError("'width' is required")
+
+class TestConfiguration(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.prog = {"config":os.path.join(self.folder, "program.ini"), "folder":self.folder}
+		self.write("defaults.ini", "[DEFAULT]\nwidth = 1\nheight = 1\ncolor = red\n[main]\ndepth = 1\n")
+		self.write("user.ini", "[main]\nheight = 2\ndepth = 2\n")
+		self.write("program.ini", "[main]\nwidth = 3\n")
+		self.environ = dict(os.environ)
+	
+	def tearDown(self):
+		os.environ.clear()
+		os.environ.update(self.environ)
+		shutil.rmtree(self.folder)
+	
+	def write(self, name, text):
+		with open(os.path.join(self.folder, name), "w") as f: f.write(text)
+	
+	def test_layers(self):
+		conf = Configuration(self.prog)
+		self.assertEqual(conf.get("main", "width"), "3")
+		self.assertEqual(conf.get("main", "height"), "2")
+		self.assertEqual(conf.get("main", "depth"), "2")
+		self.assertEqual(conf.get("other", "color"), "red")
+		self.assertEqual(conf.get("other", "size", "none"), "none")
+	
+	def test_environment(self):
+		# The environment overrides the layers, the program's configuration file overrides the environment
+		os.environ.update({"TST_WIDTH":"2", "TST_MAIN__DEPTH":"5", "TST_COLOR":"blue"})
+		conf = Configuration(self.prog)
+		self.assertEqual(conf.get("main", "width"), "3")
+		self.assertEqual(conf.get("main", "depth"), "5")
+		self.assertEqual(conf.get("main", "color"), "blue")
+		self.assertEqual(conf.conf["color"], "blue")
+	
+	def test_flat_conf(self):
+		self.write("program.ini", "[first]\nwidth = 3\nname = x\n[second]\nname = y\n")
+		self.assertEqual(Configuration(self.prog).conf["name"], "y")
+		
+		# A section first set by an environment variable keeps its place
+		os.environ["TST_SECOND__NAME"] = "z"
+		conf = Configuration(self.prog)
+		self.assertEqual(conf.conf["name"], "y")
+		self.assertEqual(list(conf.sections), ["DEFAULT", "main", "first", "second"])
+		
+		# A section only set by an environment variable comes last
+		os.environ["TST_THIRD__NAME"] = "z"
+		self.assertEqual(Configuration(self.prog).conf["name"], "z")
+	
+	def test_types(self):
+		self.write("program.ini", "[main]\nwidth = 3\nratio = 0.5\nenabled = yes\nitems = a, b\npath = ~/x\nmode = fast\n")
+		conf = Configuration(self.prog)
+		self.assertEqual(conf.get("main", "width", type=int), 3)
+		self.assertEqual(conf.get("main", "ratio", type=float), 0.5)
+		self.assertIs(conf.get("main", "enabled", type=bool), True)
+		self.assertEqual(conf.get("main", "items", type="list"), ["a", "b"])
+		self.assertEqual(conf.get("main", "path", type="path"), os.path.expanduser("~/x"))
+		self.assertEqual(conf.get("main", "mode", type=("fast", "slow")), "fast")
+		with self.assertRaisesRegex(ValueError, "^Invalid value for items in \\[main\\]: a, b "):
+			conf.get("main", "items", type=int)
+	
+	def test_required_file(self):
+		os.remove(self.prog["config"])
+		with self.assertRaises(FileNotFoundError):
+			Configuration(self.prog)
+	
+	def test_reload(self):
+		conf = Configuration(self.prog)
+		self.assertFalse(conf.reload())
+		
+		time.sleep(0.01)
+		self.write("user.ini", "[main]\nheight = 4\n")
+		self.assertTrue(conf.reload())
+		self.assertEqual(conf.get("main", "height"), "4")
+		
+		# An invalid configuration keeps the previous one
+		self.write("defaults.ini", "[DEFAULT]\n")
+		self.write("program.ini", "[main]\n")
+		with self.assertRaisesRegex(ValueError, "'width' is required"):
+			conf.reload()
+		self.assertEqual(conf.get("main", "width"), "3")
+	
+	def test_cache(self):
+		self.prog["config-cache"] = os.path.join(self.folder, "config.cache")
+		Configuration(self.prog)
+		self.assertTrue(os.path.exists(self.prog["config-cache"]))
+		self.assertEqual(Configuration(self.prog).get("main", "width"), "3")
+
+if __name__ == '__main__': unittest.main()
@@ -0,0 +1,235 @@
+#! /usr/bin/python3
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from hydra import *
+
+class Changed(BaseAction):
+	def action(self):
+		files = self.changed(self.inputs["input"], hash=self.inputs.get("hash", False))
+		if self.inputs.get("fail", False): raise ValueError("Failed")
+		return [os.path.basename(f) for f in files]
+
+class Cached(BaseAction):
+	cacheable = True
+	cache_files = ("input",)
+	cache_outputs = ("output",)
+	runs = 0
+	
+	def action(self):
+		Cached.runs += 1
+		with open(self.inputs["input"], "r") as f: data = f.read()
+		with open(self.inputs["output"], "w") as f: f.write(data.upper())
+		return "Converted {} characters".format(len(data))
+
+class DefaultOutput(Cached):
+	def standardize(self):
+		if self.inputs["output"] == "": self.inputs["output"] = self.inputs["input"] + ".out"
+
+class Resumable(BaseAction):
+	checkpoint_interval = 0
+	fail_at = None
+	processed = []
+	
+	def action(self):
+		state = self.restore()
+		if state is None: state = {"done":0}
+		
+		for i in range(state["done"], 5):
+			if i == Resumable.fail_at: raise ValueError("Failed at {}".format(i))
+			Resumable.processed.append(i)
+			state["done"] = i + 1
+			self.checkpoint(state)
+		
+		return "Processed {}".format(state["done"])
+
+class TestState(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.files = []
+		for name in ("a.txt", "b.txt"):
+			self.files.append(os.path.join(self.folder, name))
+			with open(self.files[-1], "w") as f: f.write(name)
+	
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+	
+	def run_action(self, **inputs):
+		return Changed({"input":self.files, "_state":os.path.join(self.folder, "state.db"), **inputs}, interface="test").execute()
+	
+	def test_unchanged_skipped(self):
+		self.assertEqual(self.run_action(), ["a.txt", "b.txt"])
+		self.assertEqual(self.run_action(), [])
+		
+		with open(self.files[1], "a") as f: f.write("more")
+		self.assertEqual(self.run_action(), ["b.txt"])
+		self.assertEqual(self.run_action(), [])
+	
+	def test_failed_run_not_recorded(self):
+		with self.assertRaisesRegex(ValueError, "^Failed$"):
+			self.run_action(fail=True)
+		self.assertEqual(self.run_action(), ["a.txt", "b.txt"])
+	
+	def test_full(self):
+		self.run_action()
+		self.assertEqual(self.run_action(full=True), ["a.txt", "b.txt"])
+	
+	def test_other_inputs(self):
+		self.run_action()
+		self.assertEqual(self.run_action(name="other"), ["a.txt", "b.txt"])
+		
+		# Inputs which don't change the results share the state
+		self.assertEqual(self.run_action(verbose=True, workers="2"), [])
+	
+	def test_hash(self):
+		self.run_action(hash=True)
+		st = os.stat(self.files[0])
+		os.utime(self.files[0], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+		self.assertEqual(self.run_action(hash=True), [])
+		
+		# Same size, different content
+		with open(self.files[0], "w") as f: f.write("A.txt")
+		self.assertEqual(self.run_action(hash=True), ["a.txt"])
+	
+	def test_no_state_file(self):
+		action = Changed({"input":self.files, "_state":None}, interface="test")
+		self.assertEqual(action.execute(), ["a.txt", "b.txt"])
+		self.assertEqual(action.execute(), ["a.txt", "b.txt"])
+
+class TestCache(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.input = os.path.join(self.folder, "input.txt")
+		self.output = os.path.join(self.folder, "output.txt")
+		with open(self.input, "w") as f: f.write("x" * 1000)
+		Cached.runs = 0
+	
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+	
+	def run_action(self, action=Cached, **inputs):
+		return action({"input":self.input, "output":self.output, "_cache":os.path.join(self.folder, "cache"), **inputs}, interface="test").execute()
+	
+	def read_output(self):
+		with open(self.output, "r") as f: return f.read()
+	
+	def test_hit(self):
+		self.assertEqual(self.run_action(), "Converted 1000 characters")
+		os.remove(self.output)
+		
+		self.assertEqual(self.run_action(), "Converted 1000 characters")
+		self.assertEqual(Cached.runs, 1)
+		self.assertEqual(self.read_output(), "X" * 1000)
+		
+		with open(os.path.join(self.folder, "cache", "stats.json"), "r") as f: self.assertEqual(json.load(f), {"hit":1, "miss":1})
+	
+	def test_miss(self):
+		self.run_action()
+		
+		# Changed input file
+		with open(self.input, "w") as f: f.write("y" * 500)
+		self.assertEqual(self.run_action(), "Converted 500 characters")
+		self.assertEqual(Cached.runs, 2)
+		self.assertEqual(self.read_output(), "Y" * 500)
+		
+		# Other inputs, except the outputs
+		self.run_action(mode="other")
+		self.assertEqual(Cached.runs, 3)
+		self.output = os.path.join(self.folder, "other.txt")
+		self.run_action()
+		self.assertEqual(Cached.runs, 3)
+		self.assertEqual(self.read_output(), "Y" * 500)
+		
+		# --full skips the cache
+		self.run_action(full=True)
+		self.assertEqual(Cached.runs, 4)
+	
+	def test_default_output(self):
+		self.output = ""
+		for i in range(2):
+			self.assertEqual(self.run_action(DefaultOutput), "Converted 1000 characters")
+		self.assertEqual(Cached.runs, 1)
+		self.assertEqual(sorted(os.listdir(self.folder)), ["cache", "input.txt", "input.txt.out"])
+		with open(self.input + ".out", "r") as f: self.assertEqual(f.read(), "X" * 1000)
+	
+	def test_eviction(self):
+		class Small(Cached):
+			cache_size = 1500
+		
+		self.run_action(Small)
+		time.sleep(0.05)
+		self.run_action(Small, mode="other")
+		self.assertEqual(len([e for e in os.listdir(os.path.join(self.folder, "cache")) if not e.endswith(".json")]), 1)
+		
+		# The least recently used result was removed, the last one is kept
+		self.run_action(Small, mode="other")
+		self.assertEqual(Cached.runs, 2)
+		self.run_action(Small)
+		self.assertEqual(Cached.runs, 3)
+
+class TestCheckpoint(unittest.TestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.inputs = {"input":"data", "_state":os.path.join(self.folder, "state.db")}
+		Resumable.fail_at = None
+		Resumable.processed = []
+	
+	def tearDown(self):
+		shutil.rmtree(self.folder)
+	
+	def test_resume(self):
+		Resumable.fail_at = 3
+		action = Resumable(dict(self.inputs), interface="test")
+		with self.assertRaisesRegex(ValueError, "^Failed at 3$"):
+			action.execute()
+		self.assertIsNotNone(action.checkpointed)
+		self.assertIsNotNone(Resumable(dict(self.inputs), interface="test").last_checkpoint())
+		
+		Resumable.fail_at = None
+		Resumable.processed = []
+		self.assertEqual(Resumable({**self.inputs, "resume":True}, interface="test").execute(), "Processed 5")
+		self.assertEqual(Resumable.processed, [3, 4])
+		
+		# The checkpoint is cleared after a success
+		self.assertIsNone(Resumable(dict(self.inputs), interface="test").last_checkpoint())
+	
+	def test_without_resume(self):
+		Resumable.fail_at = 3
+		with self.assertRaises(ValueError):
+			Resumable(dict(self.inputs), interface="test").execute()
+		
+		Resumable.fail_at = None
+		Resumable.processed = []
+		Resumable(dict(self.inputs), interface="test").execute()
+		self.assertEqual(Resumable.processed, [0, 1, 2, 3, 4])
+	
+	def test_other_inputs(self):
+		Resumable.fail_at = 3
+		with self.assertRaises(ValueError):
+			Resumable(dict(self.inputs), interface="test").execute()
+		
+		action = Resumable({**self.inputs, "input":"other", "resume":True}, interface="test")
+		self.assertIsNone(action.last_checkpoint())
+		self.assertIsNone(action.restore())
+	
+	def test_interval(self):
+		action = Resumable(dict(self.inputs), interface="test")
+		action.checkpoint_interval = 60
+		self.assertTrue(action.checkpoint({"done":1}))
+		self.assertFalse(action.checkpoint({"done":2}))
+		self.assertTrue(action.checkpoint({"done":3}, force=True))
+		
+		action = Resumable({**self.inputs, "resume":True}, interface="test")
+		self.assertEqual(action.restore(), {"done":3})
+	
+	def test_no_state_file(self):
+		action = Resumable({"input":"data", "_state":None, "resume":True}, interface="test")
+		self.assertFalse(action.checkpoint({"done":1}, force=True))
+		self.assertIsNone(action.restore())
+		self.assertIsNone(action.last_checkpoint())
+
+if __name__ == '__main__': unittest.main()
@@ -21,29 +21,84 @@
 # Version: 1.1.0 (2024-05-05)
 ################################################################################
 
+import collections
 import csv
-import configparser
-import decimal
+import fnmatch
 import glob
+import importlib
+import io
+import itertools
+import math
 import os
-import subprocess
+import queue
+import signal
 import sys
+import threading
 import time
-import tkinter as tk
-import webbrowser
-from tkinter import messagebox
-from tkinter import filedialog
-from tkinter import ttk
+
+class _LazyModule:
+	"""Proxy for a module which is imported on first use, so CLI programs don't pay for the GUI imports."""
+	
+	def __init__(self, name, submodules=()):
+		"""Initialize the object.
+		
+		Parameters:
+			name - Module name.
+			submodules - Names of other modules to import with this one.
+		"""
+		self._name = name
+		self._submodules = submodules
+		self._module = None
+	
+	def __getattr__(self, attr):
+		if self._module is None:
+			for m in self._submodules: importlib.import_module(m)
+			self._module = importlib.import_module(self._name)
+		return getattr(self._module, attr)
+
+_tkinter_modules = ("tkinter.messagebox", "tkinter.filedialog", "tkinter.simpledialog", "tkinter.ttk")
+tk = _LazyModule("tkinter", _tkinter_modules)
+ttk = _LazyModule("tkinter.ttk", _tkinter_modules)
+messagebox = _LazyModule("tkinter.messagebox", _tkinter_modules)
+filedialog = _LazyModule("tkinter.filedialog", _tkinter_modules)
+webbrowser = _LazyModule("webbrowser")
+subprocess = _LazyModule("subprocess")
+decimal = _LazyModule("decimal")
+configparser = _LazyModule("configparser")
+
+class _TkClass(type):
+	"""Metaclass which adds the Tk base class, returned by cls._tk_base(), when a class is first instantiated."""
+	
+	def __call__(cls, *args, **kwargs):
+		base = cls._tk_base()
+		if not issubclass(cls, base):
+			if "_tk_class" not in cls.__dict__:
+				cls._tk_class = _TkClass(cls.__name__, (cls, base), {"__module__":cls.__module__, "__qualname__":cls.__qualname__, "__doc__":cls.__doc__})
+			cls = cls.__dict__["_tk_class"]
+		return type.__call__(cls, *args, **kwargs)
+
+class ActionCancelled(Exception):
+	"""Raised inside an action when the user cancels it."""
+	pass
 
 class BaseConfiguration:
 	"""Base class for loading and validating configuration files.
 	
+	The configuration is read from layers, each overriding the previous ones: the files from define_layers (i.e. packaged defaults, system and user files), the environment variables starting with env_prefix, then the configuration file. Parsed files are cached by filename, modification time and size, in memory and in the prog["config-cache"] file if it is defined.
+	
 	Attributes:
 		filename - Path to a configuration file.
 		prog - Program constants dictionary.
 		conf - Dictionary storing the option/value pairs. 
+		sections - Dictionary of {section: {option: value}} merged from all layers.
+		layers - List of the configuration filenames read before the configuration file.
+		values - Dictionary of the values parsed by get, by (section, option, type).
+		stamps - List of the (filename, modification time, size) of the files when they were loaded.
+		env_prefix - Class prefix of the environment variables which override the options of the layers, or None.
 	"""
 	
+	env_prefix = None
+	
 	def __init__(self, prog):
 		"""Initalize the object.
 		
@@ -53,20 +108,113 @@ class BaseConfiguration:
 		self.prog = prog
 		self.filename = prog["config"]
 		self.conf = {}
+		self.sections = {}
+		self.values = {}
+		self.stamps = []
+		self.layers = [f for f in self.define_layers() if f is not None]
+		
+		if (self.filename is not None) or self.layers or (self.env_prefix is not None):
+			if (self.filename is not None) and ("{path}" in self.filename): self.filename = self.filename.format(path="")
+			self.load()
+			self.validate()
+	
+	def define_layers(self):
+		"""Return the list of configuration filenames to read before the configuration file, from lowest to highest precedence. Missing files are skipped."""
+		return []
+	
+	def files(self):
+		"""Return the list of (filename, required) of the configuration files, from lowest to highest precedence."""
+		files = [(os.path.expanduser(f), False) for f in self.layers]
+		if self.filename is not None: files.append((self.filename, True))
+		return files
+	
+	def stat(self):
+		"""Return the list of (filename, modification time, size) of the configuration files, with None for missing files."""
+		stamps = []
+		for (filename, required) in self.files():
+			try:
+				st = os.stat(filename)
+				stamps.append((filename, st.st_mtime_ns, st.st_size))
+			except OSError:
+				stamps.append((filename, None, None))
+		return stamps
+	
+	def reload(self):
+		"""Load and validate the configuration again if any of its files changed since it was loaded. Return True if it was reloaded.
+		
+		If the new configuration is invalid, the previous one is kept and the exception is raised.
+		"""
+		if self.stat() == self.stamps: return False
 		
-		if self.filename is not None:
-			if "{path}" in self.filename: self.filename = self.filename.format(path="")
+		previous = (self.conf, self.sections, self.values, self.stamps)
+		try:
 			self.load()
 			self.validate()
+		except Exception:
+			(self.conf, self.sections, self.values, self.stamps) = previous
+			raise
+		
+		return True
 	
 	def load(self):
-		"""Load the configuration file into self.conf."""
-		open(self.filename, "r").close()
-		cp = configparser.ConfigParser()
-		cp.read(self.filename)
-		for s in cp.sections():
-			for o in cp.options(s):
-				self.conf[o] = cp.get(s, o)
+		"""Load the configuration layers, the environment variables and the configuration file into self.sections and self.conf."""
+		# Stat before reading, so a file changed while it is read is loaded again by the next reload
+		self.stamps = self.stat()
+		
+		parsed = _read_config(self.files(), self.prog.get("config-cache"))
+		config = parsed.pop() if self.filename is not None else []
+		
+		sections = {"DEFAULT": {}}
+		for layer in parsed:
+			for (section, options) in layer: sections.setdefault(section, {}).update(options)
+		
+		if self.env_prefix is not None:
+			names = {s.upper():s for layer in parsed + [config] for (s, options) in layer}
+			for (name, value) in os.environ.items():
+				if (not name.startswith(self.env_prefix)) or (name == self.env_prefix): continue
+				
+				# PREFIX_SECTION__OPTION sets an option of one section, PREFIX_OPTION sets it in every section
+				(section, _, option) = name[len(self.env_prefix):].rpartition("__")
+				if section == "":
+					for options in sections.values():
+						if option.lower() in options: options[option.lower()] = value
+					sections["DEFAULT"][option.lower()] = value
+				else:
+					sections.setdefault(names.get(section.upper(), section), {})[option.lower()] = value
+		
+		# The program's configuration file overrides the environment variables
+		for (section, options) in config: sections.setdefault(section, {}).update(options)
+		
+		# Keep the sections in file order, so sections first set by environment variables don't change the flat conf
+		order = ["DEFAULT"]
+		for layer in parsed + [config]: order += [s for (s, options) in layer if s not in order]
+		order += [s for s in sections if s not in order]
+		sections = {s:sections[s] for s in order}
+		
+		self.sections = sections
+		self.values = {}
+		self.conf = dict(sections["DEFAULT"])
+		for (section, options) in sections.items(): self.conf.update(options)
+	
+	def get(self, section, option, default=None, type=str):
+		"""Return the value of an option in a section, or in the DEFAULT section, converted to the type. Values are only converted once.
+		
+		Parameters:
+			section - Section name.
+			option - Option name.
+			default - Value returned if the option isn't set.
+			type - str, int, float, bool, "path" (with ~ expanded), "list" (comma separated), a tuple of the allowed values or a function converting the string.
+		"""
+		if isinstance(type, list): type = tuple(type)
+		key = (section, option.lower(), type)
+		if key in self.values: return self.values[key]
+		
+		value = self.sections.get(section, {}).get(option.lower(), self.sections.get("DEFAULT", {}).get(option.lower()))
+		if value is None: return default
+		
+		value = _convert(value, type, "{} in [{}]".format(option, section))
+		self.values[key] = value
+		return value
 	
 	def validate(self):
 		"""Raise an exception if any configuration values are invalid."""
@@ -79,29 +227,57 @@ class BaseCLI:
 		prog - Program constants dictionary.
 		conf - Configuration dictionary.
 		arguments - Command line arguments (sys.argv).
+		spec - Compiled ArgumentSpec of the arguments.
+		registry - Class ActionRegistry of the actions selected with --action, or None.
 		usage - Commandl line usage.
 		last_update - Unix timestamp of last user progress update.
+		rate - ProgressRate object tracking the throughput of the action.
+		tasks - Dictionary of the running action's ProgressTask objects.
+		lines - Number of lines written by the last progress update.
 		inputs - User input dictionary.
+		stdout - File object for all output.
+		interactive - Flag to allow prompting the user for input.
+		running - The BaseAction object currently executing, or None.
+		progress_format - Progress format, "text" or "jsonl".
+		progress_file - File object for the progress and events.
+		interval - Minimum milliseconds between progress updates.
 	"""
 	
-	def __init__(self, prog, conf, argv):
+	registry = None
+	
+	def __init__(self, prog, conf, argv, stdout=None, interactive=True):
 		"""Initialize the object.
 		
 		Parameters:
 			prog - Program constants dictionary.
 			conf - Configuration dictionary.
 			argv - Command line arguments (sys.argv).
+			stdout - File object for all output, defaults to sys.stdout.
+			interactive - Flag to allow prompting the user for input.
 		"""
 		self.prog = prog
 		self.conf = conf
+		self.stdout = stdout if stdout is not None else sys.stdout
+		self.interactive = interactive
 		self.arguments = []
+		self.spec = None
 		self.usage = ""
 		self.last_update = 0
+		self.rate = ProgressRate()
+		self.tasks = {}
+		self.lines = 1
 		self.twidth = 80
+		self.running = None
+		self.progress_format = "text"
+		self.progress_file = self.stdout
+		self.interval = 100
 		
 		self.define_arguments()
+		self.define_standard_arguments()
+		self.spec = self.compile_arguments()
 		self.define_usage()
 		self.inputs = self.parse_arguments(argv, conf)
+		self.open_progress()
 		
 		self.action()
 	
@@ -109,37 +285,60 @@ class BaseCLI:
 		"""Define the command line arguments."""
 		pass
 		
+	def define_standard_arguments(self):
+		"""Add the standard arguments which are not already defined."""
+		defined = {a[0] for a in self.arguments}
+		if self.registry is not None:
+			# A defined --action keeps its short name and description, and gets the registry's choices
+			choices = tuple(self.registry.names())
+			for (i, argument) in enumerate(self.arguments):
+				if argument[0] == "action": self.arguments[i] = tuple(argument[:4]) + (choices, True)
+			if "action" not in defined: self.arguments.append(("action", "", _wrap("Action to perform: {}".format(", ".join(choices)), 40), "value", choices, True))
+		if "workers" not in defined: self.arguments.append(("workers", "", "Number of worker processes", "value", _positive_int))
+		if "batch" not in defined: self.arguments.append(("batch", "", "Run one job per line of the file (JSON or\ncommand line arguments)", "value"))
+		if "serve" not in defined: self.arguments.append(("serve", "", "Run jobs sent to the Unix socket", "value"))
+		if "connect" not in defined: self.arguments.append(("connect", "", "Send the job to the server on the Unix\nsocket", "value"))
+		if "progress-format" not in defined: self.arguments.append(("progress-format", "", "Progress format, text (default) or jsonl", "value", ("text", "jsonl")))
+		if "progress-fd" not in defined: self.arguments.append(("progress-fd", "", "Write the progress to stdout (default),\nstderr or a file descriptor", "value"))
+		if ("full" not in defined) and ((self.prog.get("state") is not None) or (self.prog.get("cache") is not None)): self.arguments.append(("full", "", "Process all inputs, including those\nunchanged since the last run", "boolean"))
+		if ("resume" not in defined) and (self.prog.get("state") is not None): self.arguments.append(("resume", "", "Restart from the last checkpoint of a\nfailed run with the same inputs", "boolean"))
+		if "watch" not in defined: self.arguments.append(("watch", "", "Keep running the action on changed or\nadded input files", "boolean"))
+		if "watch-interval" not in defined: self.arguments.append(("watch-interval", "", "Seconds between checks of the input\nfiles with --watch (default 2)", "value", float))
+		if "watch-debounce" not in defined: self.arguments.append(("watch-debounce", "", "Seconds without changes before running\nthe action with --watch (default 1)", "value", float))
+	
 	def define_usage(self):
 		"""Define the command line usage."""
 		pass
 	
+	def compile_arguments(self):
+		"""Return the ArgumentSpec of self.arguments, compiled once per class and reused while the arguments don't change."""
+		arguments = tuple(tuple(a) for a in self.arguments)
+		spec = _argument_specs.get(self.__class__)
+		if (spec is None) or (spec.arguments != arguments):
+			spec = _argument_specs[self.__class__] = ArgumentSpec(arguments)
+		return spec
+	
 	def parse_arguments(self, argv, defaults):
-		"""Parse the command line arguments and return them in a dictionary.
+		"""Parse the command line arguments and return them in a dictionary. Values are converted to the type of their argument.
 			
 		Parameters:
 			argv - Command line arguments (sys.argv).
+			defaults - Dictionary of default values.
 		"""
-		flags = self.conf
-		map = {}
+		spec = self.spec if self.spec is not None else self.compile_arguments()
+		flags = defaults.copy()
+		map = spec.short
 		count = 0
 		
 		# Initialize flags
-		boolean = []
-		value = []
-		multiple = []
-		for (long, short, desc, type) in self.arguments:
-			if short != "": map[short] = long
-			if type == "boolean":
-				flags[long] = False
-				boolean.append(long)
-			elif type == "value":
-				flags[long] = defaults.get(long, "")
-				value.append(long)
-			elif type == "multiple":
-				flags[long] = [] if defaults.get(long, "") == "" else [defaults.get(long, "")]
-				multiple.append(long)
-			else:
-				raise ValueError("Invalid argument type: {}".format(type))
+		boolean = spec.boolean
+		value = spec.value
+		multiple = spec.multiple
+		for long in boolean: flags[long] = False
+		for long in value: flags[long] = defaults.get(long, "")
+		for long in multiple:
+			default = defaults.get(long, "")
+			flags[long] = [] if default in ("", None) else list(default) if isinstance(default, list) else [default]
 		
 		# Convert all flags to their long version
 		long_args = []
@@ -151,12 +350,10 @@ class BaseCLI:
 				# `--flag=value` or `--flag value`?
 				extra = None
 				if "=" in val:
-					tmp = val.split("=")
-					val = tmp[0]
-					extra = tmp[1]
+					(val, _, extra) = val.partition("=")
 				
 				# Is this a valid flag?
-				if val in flags:
+				if val in spec.types:
 					long_args.append("--{}".format(val))
 					if extra is not None: long_args.append(extra)
 					count += 1
@@ -204,26 +401,58 @@ class BaseCLI:
 					flags[expecting_value] = val
 				elif expecting_value in multiple:
 					flags[expecting_value].append(val)
-				
+		
+		# Convert the values, including the defaults from the configuration
+		for (long, type) in spec.converters.items():
+			if long in multiple:
+				flags[long] = [_convert(v, type, "--" + long) for v in flags[long]]
+			elif flags[long] in ("", None):
+				flags[long] = None
+			else:
+				flags[long] = _convert(flags[long], type, "--" + long)
+		
+		# Required arguments aren't needed to show information or to run jobs from elsewhere
+		if not any(flags.get(f) for f in ("help", "version", "license", "batch", "serve", "connect")):
+			missing = ["--" + long for long in spec.required if flags[long] in ("", None, [])]
+			if missing: raise ValueError("Missing required argument{}: {}".format("s" if len(missing) > 1 else "", ", ".join(missing)))
+		
 		flags["_count"] = count
+		flags["_state"] = self.prog.get("state")
+		flags["_cache"] = self.prog.get("cache")
 		
 		return flags
 	
+	def open_progress(self):
+		"""Set the progress format, file and update interval from the --progress-format and --progress-fd arguments.
+		
+		Progress is updated at most every 100 ms on a terminal and every second otherwise.
+		"""
+		self.progress_format = self.inputs["progress-format"] if self.inputs["progress-format"] is not None else "text"
+		
+		target = self.inputs["progress-fd"]
+		if target in ("", "stdout"): self.progress_file = self.stdout
+		elif target == "stderr": self.progress_file = sys.stderr
+		elif target.isdigit(): self.progress_file = open(int(target), "w", encoding="utf-8", closefd=False)
+		else: raise ValueError("Invalid progress file descriptor: {}".format(target))
+		
+		tty = hasattr(self.progress_file, "isatty") and self.progress_file.isatty()
+		self.interval = 100 if tty else 1000
+	
 	def print_help(self):
 		"""Print the help information to standard out."""
 		width = 40
 
-		print("")
-		print(self.prog["name"], self.prog["version"])
-		print(self.prog["purpose"])
+		print("", file=self.stdout)
+		print(self.prog["name"], self.prog["version"], file=self.stdout)
+		print(self.prog["purpose"], file=self.stdout)
 		
 		usage = self.usage.strip().split("\n")
 		prefix = "Usage:"
 		for u in usage:
-			print(prefix, u.strip())
+			print(prefix, u.strip(), file=self.stdout)
 			prefix = "      "
 		
-		for (long, short, desc, type) in self.arguments:
+		for (long, short, desc, type) in (a[:4] for a in self.spec.arguments):
 			if type == "boolean":
 				if short != "": short = "-{}, ".format(short)
 				long = "--{}".format(long)
@@ -236,49 +465,95 @@ class BaseCLI:
 			
 			arg = "  {}{}".format(short, long).ljust(width)[0:width]
 			desc = desc.replace("\n", "\n {}".format(" " * width))
-			print("{} {}".format(arg, desc))
+			print("{} {}".format(arg, desc), file=self.stdout)
 		
-		print("")
+		print("", file=self.stdout)
+		
+		if (self.registry is not None) and any(d != "" for (t, target, d) in self.registry.actions.values()):
+			print("Actions:", file=self.stdout)
+			for (name, (text, target, desc)) in self.registry.actions.items():
+				print("{} {}".format("  {}".format(name).ljust(width)[0:width], desc.replace("\n", "\n {}".format(" " * width))).rstrip(), file=self.stdout)
+			print("", file=self.stdout)
 		
 		if self.prog["config"] is not None:
-			print("See '{}' for default values".format(self.prog["config"]))
-			print("")
+			print("See '{}' for default values".format(self.prog["config"]), file=self.stdout)
+			print("", file=self.stdout)
 		
 		if self.prog["url"] is not None:
-			print(self.prog["url"])
-			print("")
+			print(self.prog["url"], file=self.stdout)
+			print("", file=self.stdout)
 	
 	def print_version(self):
 		"""Print the program name and version."""
-		print("")
-		print(self.prog["name"], self.prog["version"], self.prog["date"])
-		print("")
+		print("", file=self.stdout)
+		print(self.prog["name"], self.prog["version"], self.prog["date"], file=self.stdout)
+		print("", file=self.stdout)
 	
 	def print_license(self):
 		"""Print the program's license information."""
-		print("")
-		print(self.prog["name"], self.prog["version"])
-		print("")
-		print(self.prog["copyright"])
-		print("")
+		print("", file=self.stdout)
+		print(self.prog["name"], self.prog["version"], file=self.stdout)
+		print("", file=self.stdout)
+		print(self.prog["copyright"], file=self.stdout)
+		print("", file=self.stdout)
 		if self.prog["license"] is not None:
-			print(self.prog["license"])
-			print("")
+			print(self.prog["license"], file=self.stdout)
+			print("", file=self.stdout)
 	
-	def output_progress(self, text, started=None, processed=None, total=None):
-		"""Print progress information to standard out.
+	def output_progress(self, text, started=None, processed=None, total=None, processed_bytes=None, total_bytes=None):
+		"""Print progress information to the progress file, as text or as a progress event.
 		
 		Parameters:
 			text - Progress text.
 			started - Unix timestamp of when the program started.
 			processed - Counter of processed items.
 			total - Total number of items to process.
+			processed_bytes - Counter of processed bytes.
+			total_bytes - Total number of bytes to process.
 		"""
 		if not self.inputs["quiet"]:
-			p = progress(self.last_update, text, started, processed, total)
+			p = progress(self.last_update, text, started, processed, total, processed_bytes, total_bytes, self.rate, self.interval)
 			if p is not None:
 				self.last_update = p[0]
-				print(p[1].ljust(self.twidth)[0:self.twidth], end="\r", flush=True)
+				tasks = list(self.tasks.values())
+				if self.progress_format == "jsonl":
+					if (text == "") and (started is None): return
+					self.output_event("progress", text=text, elapsed=(time.time() - started) if started is not None else None,
+						processed=processed, total=total, processed_bytes=processed_bytes, total_bytes=total_bytes,
+						remaining=self.rate.remaining(processed, total, processed_bytes, total_bytes) if started is not None else None,
+						items_per_second=self.rate.items, bytes_per_second=self.rate.bytes,
+						tasks=[{"name": t.name, "processed": t.processed, "total": t.total, "processed_bytes": t.processed_bytes, "total_bytes": t.total_bytes} for t in tasks])
+				elif (tasks or (self.lines > 1)) and hasattr(self.progress_file, "isatty") and self.progress_file.isatty():
+					self.output_tasks(p[1], tasks)
+				else:
+					print(p[1].ljust(self.twidth)[0:self.twidth], end="\r", flush=True, file=self.progress_file)
+	
+	def output_tasks(self, text, tasks):
+		"""Replace the previous progress lines with the progress text and one line per task, using ANSI escape codes.
+		
+		Parameters:
+			text - Progress text.
+			tasks - List of ProgressTask objects.
+		"""
+		lines = [text] + ["  {} | {}".format(t.name, t.status()) for t in tasks]
+		lines = [l[0:self.twidth] for l in lines]
+		
+		# Move to the start of the first line and clear to the end of the screen
+		up = "\x1b[{}F".format(self.lines - 1) if self.lines > 1 else "\r"
+		print(up + "\x1b[J" + "\n".join(lines), end="\r", flush=True, file=self.progress_file)
+		self.lines = len(lines)
+	
+	def output_event(self, event, **fields):
+		"""Write an event as one line of JSON, with the event name and a Unix timestamp, to the progress file.
+		
+		Parameters:
+			event - Event name, i.e. "start", "progress", "warning", "error" or "finished".
+			fields - Event values.
+		"""
+		import json
+		
+		fields = dict(event=event, time=time.time(), **fields)
+		print(json.dumps(fields, default=str), flush=True, file=self.progress_file)
 	
 	def user_message(self, message):
 		"""Show a message to the user.
@@ -286,8 +561,9 @@ class BaseCLI:
 		Paramaters:
 			message - Message text.
 		"""
-		print(message)
-		_ = input("Press enter to continue...")
+		if self.progress_format == "jsonl": self.output_event("message", message=message)
+		else: print(message, file=self.stdout)
+		if self.interactive: _ = input("Press enter to continue...")
 		
 	def user_warning(self, message):
 		"""Show a warning message to the user.
@@ -295,8 +571,9 @@ class BaseCLI:
 		Paramaters:
 			message - Message text.
 		"""
-		print("WARNING:", message)
-		_ = input("Press enter to continue...")
+		if self.progress_format == "jsonl": self.output_event("warning", message=message)
+		else: print("WARNING:", message, file=self.stdout)
+		if self.interactive: _ = input("Press enter to continue...")
 		
 	def user_error(self, message):
 		"""Show an error message to the user.
@@ -304,8 +581,9 @@ class BaseCLI:
 		Paramaters:
 			message - Message text.
 		"""
-		print("ERROR:", message)
-		_ = input("Press enter to continue...")
+		if self.progress_format == "jsonl": self.output_event("error", message=message)
+		else: print("ERROR:", message, file=self.stdout)
+		if self.interactive: _ = input("Press enter to continue...")
 	
 	def user_confirm(self, message, include_cancel=False):
 		"""Ask the user for confirmation and return True, False or None.
@@ -317,6 +595,11 @@ class BaseCLI:
 		if include_cancel: message += " ([y]es/[n]o/[c]ancel): "
 		else: message += " ([y]es/[n]o): "
 		
+		if not self.interactive:
+			if self.progress_format == "jsonl": self.output_event("confirm", message=message, response=None if include_cancel else False)
+			else: print(message, file=self.stdout)
+			return None if include_cancel else False
+		
 		while True:
 			response = input(message)
 			if response[0:1].lower() == "y": return True
@@ -333,20 +616,221 @@ class BaseCLI:
 		if default == "": message = "{}: ".format(message)
 		else: message = "{} [default={}]: ".format(message, default)
 		
+		if not self.interactive:
+			if self.progress_format == "jsonl": self.output_event("input", message=message, response=default)
+			else: print(message, file=self.stdout)
+			return default
+		
 		response = input(message)
 		if (response == "") and (default != ""): response = default
 		return response
 	
 	def get_action(self, inputs):
-		"""Return the BaseAction subclass to use.
+		"""Return the BaseAction subclass to use, by default the --action loaded from the registry.
 		
 		Parameters:
 			inputs - User input dictionary.
 		"""
-		pass
+		if self.registry is not None: return self.registry.load(inputs["action"])
+	
+	def execute(self, action):
+		"""Execute the action, treating the first SIGINT as a request to cancel it.
+		
+		Parameters:
+			action - A BaseAction object.
+		"""
+		if threading.current_thread() is not threading.main_thread(): return action.execute()
+		
+		def interrupt(signum, frame):
+			action.cancel()
+			signal.signal(signal.SIGINT, previous)
+			if self.progress_format == "jsonl": self.output_event("cancelling")
+			elif not self.inputs["quiet"]: print("\nCancelling, press Ctrl-C again to abort...", file=self.stdout)
+		
+		previous = signal.signal(signal.SIGINT, interrupt)
+		try:
+			return action.execute()
+		finally:
+			signal.signal(signal.SIGINT, previous)
+	
+	def read_batch(self, filename):
+		"""Return the list of jobs, each a list of command line arguments, in the batch file.
+		
+		Each line is either a JSON list of arguments, a JSON object of argument/value pairs or command line arguments. Blank lines and lines starting with # are ignored.
+		
+		Parameters:
+			filename - Batch filename or "STDIN".
+		"""
+		import json
+		import shlex
+		
+		jobs = []
+		f = sys.stdin if filename == "STDIN" else open(filename, "r", encoding="utf-8")
+		try:
+			for line in f:
+				line = line.strip()
+				if (line == "") or line.startswith("#"):
+					continue
+				elif line.startswith("["):
+					jobs.append([str(a) for a in json.loads(line)])
+				elif line.startswith("{"):
+					argv = []
+					for (name, value) in json.loads(line).items():
+						if value is True: argv.append("--{}".format(name))
+						elif isinstance(value, list): argv += ["--{}".format(name)] + [str(v) for v in value]
+						elif (value is not False) and (value is not None): argv += ["--{}".format(name), str(value)]
+					jobs.append(argv)
+				else:
+					jobs.append(shlex.split(line))
+		finally:
+			if f is not sys.stdin: f.close()
+		
+		return jobs
+	
+	def run_batch(self, filename):
+		"""Run every job in the batch file and print a summary of the results.
+		
+		Jobs use the configuration and the value arguments given on the command line as defaults. With --workers greater than 1, jobs run on a process pool without progress or user interaction, and Ctrl-C stops the batch with a summary of the finished jobs. The details of failed jobs are written to the error file in both cases.
+		
+		Parameters:
+			filename - Batch filename or "STDIN".
+		"""
+		jobs = self.read_batch(filename)
+		defaults = self.conf.copy()
+		for long in self.spec.value:
+			if long != "batch": defaults[long] = self.inputs[long]
+		workers = self.inputs["workers"] if self.inputs["workers"] is not None else 1
+		results = [None] * len(jobs)
+		
+		# Resolve the action for every job, recording argument errors as failed jobs
+		actions = []
+		for (i, argv) in enumerate(jobs):
+			try:
+				inputs = self.parse_arguments(argv, defaults)
+				actions.append((i, self.get_action(inputs), inputs))
+			except Exception as e:
+				results[i] = (False, str(e), 0.0)
+		
+		started = time.time()
+		if workers > 1:
+			import concurrent.futures
+			
+			# Process workers ignore SIGINT, so Ctrl-C only stops the batch in this process
+			pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=_ignore_sigint)
+			try:
+				futures = {pool.submit(_run_job, action, inputs):i for (i, action, inputs) in actions}
+				for (done, future) in enumerate(concurrent.futures.as_completed(futures), 1):
+					(ok, message, seconds, details) = future.result()
+					results[futures[future]] = (ok, message, seconds)
+					if details is not None: _write_error(details, self.prog["error"])
+					self.output_progress("Batch", started, done, len(futures))
+			except KeyboardInterrupt:
+				if self.progress_format == "jsonl": self.output_event("cancelling")
+				elif not self.inputs["quiet"]: print("\nCancelling, waiting for the running jobs...", file=self.stdout)
+				for (i, result) in enumerate(results):
+					if result is None: results[i] = (False, "Cancelled by user", 0.0)
+			finally:
+				pool.shutdown(wait=False, cancel_futures=True)
+		else:
+			for (i, action, inputs) in actions:
+				job_started = time.time()
+				try:
+					action = action(inputs, self.output_progress, self.user_message, self.user_warning, self.user_error, self.user_confirm, self.user_input, "cli")
+					self.tasks = action.tasks
+					results[i] = (True, self.execute(action), time.time() - job_started)
+				except ActionCancelled:
+					raise
+				except Exception as e:
+					results[i] = (False, str(e), time.time() - job_started)
+					error_output(e, self.prog["error"])
+		
+		if not self.inputs["quiet"]: self.output_progress("")
+		
+		failed = 0
+		for (i, (ok, message, seconds)) in enumerate(results):
+			if not ok: failed += 1
+			if self.progress_format == "jsonl": self.output_event("job", job=i + 1, ok=ok, message=message, seconds=seconds)
+			elif (not ok) or (not self.inputs["quiet"]): print("Job {}: {} ({:.2f}s) {}".format(i + 1, "OK" if ok else "ERROR", seconds, message), file=self.stdout)
+		
+		if self.progress_format == "jsonl":
+			self.output_event("finished", message="{} jobs, {} succeeded, {} failed".format(len(results), len(results) - failed, failed), seconds=time.time() - started, jobs=len(results), failed=failed)
+		elif not self.inputs["quiet"]:
+			print("", file=self.stdout)
+			print("{} jobs, {} succeeded, {} failed".format(len(results), len(results) - failed, failed), file=self.stdout)
+			print("", file=self.stdout)
+	
+	def serve(self, path):
+		"""Run jobs sent by clients (see hydra.connect) to a Unix domain socket until interrupted.
+		
+		Each job runs in a new instance of this class, sharing the configuration, with its output sent back to the client. At most --workers jobs run at the same time.
+		
+		Parameters:
+			path - Socket filename.
+		"""
+		import concurrent.futures
+		import socket
+		import stat
+		
+		workers = self.inputs["workers"] if self.inputs["workers"] is not None else (os.cpu_count() or 1)
+		slots = threading.BoundedSemaphore(workers)
+		
+		if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode): os.remove(path)
+		server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		server.bind(path)
+		server.listen()
+		
+		if not self.inputs["quiet"]: print("Serving on {}, press Ctrl-C to stop...".format(path), file=self.stdout, flush=True)
+		
+		def run(connection):
+			try:
+				self.serve_client(connection)
+			finally:
+				slots.release()
+		
+		try:
+			with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+				while True:
+					slots.acquire()
+					(connection, _) = server.accept()
+					pool.submit(run, connection)
+		except KeyboardInterrupt:
+			if not self.inputs["quiet"]: print("", file=self.stdout)
+		finally:
+			server.close()
+			os.remove(path)
+	
+	def serve_client(self, connection):
+		"""Read one job (a JSON list of command line arguments) from the connection, run it and send back the output.
+		
+		Jobs using --serve, --connect, --batch or --watch are rejected, since they would hold a worker slot indefinitely.
+		
+		Parameters:
+			connection - A connected socket.
+		"""
+		import json
+		
+		with connection:
+			stdout = connection.makefile("w", encoding="utf-8")
+			try:
+				argv = json.loads(connection.makefile("r", encoding="utf-8").readline())
+				flags = self.parse_arguments(argv, self.conf)
+				rejected = ["--" + f for f in ("serve", "connect", "batch", "watch") if flags.get(f)]
+				if rejected: raise ValueError("{} can't be used in a job sent to a server".format(", ".join(rejected)))
+				self.__class__(self.prog, self.conf, argv, stdout=stdout, interactive=False)
+			except Exception as e:
+				print("\nERROR:\n{}\n".format(e), file=stdout)
+			finally:
+				try:
+					stdout.close()
+				except OSError:
+					pass
 	
 	def action(self):
-		"""Validate the user's input and perform the action."""
+		"""Validate the user's input and perform the action.
+		
+		With --progress-format=jsonl the start, final message, cancellation and errors are written as events to the progress file instead of as text.
+		"""
+		started = time.time()
 		try:
 			if (self.inputs["help"]) or ((self.inputs["_count"] == 0) and ((sys.stdin is not None) and sys.stdin.isatty())):
 				self.print_help()
@@ -354,32 +838,128 @@ class BaseCLI:
 				self.print_version()
 			elif self.inputs["license"]:
 				self.print_license()
+			elif self.inputs["batch"] != "":
+				self.run_batch(self.inputs["batch"])
+			elif self.inputs["serve"] != "":
+				self.serve(self.inputs["serve"])
+			elif self.inputs.get("watch", False):
+				self.watch()
 			else:
-				if not self.inputs["quiet"]: print("")
-				
-				action = self.get_action(self.inputs)
-				try:
-					action = action(self.inputs, self.output_progress, self.user_message, self.user_warning, self.user_error, self.user_confirm, self.user_input, "cli")
-				except TypeError as e:
-					raise TypeError("{}.get_action must return a subclass of BaseAction, received: {}".format(self.__class__.__name__, action))
-				message = action.execute()
-				
-				if not self.inputs["quiet"]:
-					self.output_progress("")
-					print(message)
-					print("")
+				self.run_action(self.inputs)
 		except Exception as e:
-			print("ERROR:".ljust(self.twidth))
-			print(str(e))
-			print("")
-			if self.inputs.get("verbose", False):
-				import traceback
-				print(traceback.format_exc())
+			self.output_exception(e, started)
+	
+	def run_action(self, inputs):
+		"""Perform the action for the inputs, print its message and return the BaseAction object.
+		
+		Parameters:
+			inputs - User input dictionary.
+		"""
+		jsonl = self.progress_format == "jsonl"
+		started = time.time()
+		if (not self.inputs["quiet"]) and (not jsonl): print("", file=self.stdout)
+		
+		action = self.get_action(inputs)
+		try:
+			# The action gets a copy, so its standardize() doesn't change the inputs of later runs
+			action = action(_copy_inputs(inputs), self.output_progress, self.user_message, self.user_warning, self.user_error, self.user_confirm, self.user_input, "cli")
+		except TypeError as e:
+			raise TypeError("{}.get_action must return a subclass of BaseAction, received: {}".format(self.__class__.__name__, action))
+		self.running = action
+		self.tasks = action.tasks
+		if jsonl: self.output_event("start", name=self.prog["name"], version=self.prog["version"], action=action.__class__.__name__)
+		message = self.execute(action)
+		self.running = None
+		
+		if jsonl:
+			self.output_event("finished", message=message, seconds=time.time() - started)
+		elif not self.inputs["quiet"]:
+			self.output_progress("")
+			print(message, file=self.stdout)
+			print("", file=self.stdout)
+		
+		return action
+	
+	def output_exception(self, e, started):
+		"""Print the error or cancellation raised by an action and write the error file.
+		
+		Parameters:
+			e - An exception object.
+			started - Unix timestamp of when the action started.
+		"""
+		import traceback
+		
+		jsonl = self.progress_format == "jsonl"
+		resumable = (self.running is not None) and (self.running.checkpointed is not None)
+		self.running = None
+		
+		if isinstance(e, ActionCancelled):
+			if jsonl:
+				self.output_event("cancelled", message=str(e), seconds=time.time() - started, resumable=resumable)
+			else:
+				print("CANCELLED:".ljust(self.twidth), file=self.stdout)
+				print(str(e), file=self.stdout)
+				print("", file=self.stdout)
+				if resumable: print("Run again with --resume to restart from the last checkpoint.\n", file=self.stdout)
+		else:
+			if jsonl:
+				self.output_event("error", message=str(e), type=e.__class__.__name__, seconds=time.time() - started, resumable=resumable, traceback=traceback.format_exc() if self.inputs.get("verbose", False) else None)
+			else:
+				print("ERROR:".ljust(self.twidth), file=self.stdout)
+				print(str(e), file=self.stdout)
+				print("", file=self.stdout)
+				if resumable: print("Run again with --resume to restart from the last checkpoint.\n", file=self.stdout)
+				if self.inputs.get("verbose", False): print(traceback.format_exc(), file=self.stdout)
 			
 			error_output(e, self.prog["error"])
+	
+	def watch(self):
+		"""Perform the action, then poll the files found by its expand and iexpand calls and perform it again with only the changed or added files, until interrupted.
+		
+		A change is only acted on once the files haven't changed for --watch-debounce seconds (default 1), and the files are checked every --watch-interval seconds (default 2). Errors are printed without stopping the watch, cancelling an action stops it.
+		"""
+		interval = self.inputs["watch-interval"] if self.inputs["watch-interval"] is not None else 2.0
+		debounce = self.inputs["watch-debounce"] if self.inputs["watch-debounce"] is not None else 1.0
+		if (interval <= 0) or (debounce < 0): raise ValueError("Invalid watch interval or debounce")
+		
+		watched = self.run_action(self.inputs).watched
+		if not watched: raise ValueError("Nothing to watch, the action doesn't expand any inputs")
+		snapshot = _snapshot(watched)
+		
+		if self.progress_format == "jsonl": self.output_event("watching", fields=sorted(watched))
+		elif not self.inputs["quiet"]: print("Watching for changes, press Ctrl-C to stop...", file=self.stdout, flush=True)
+		
+		try:
+			while True:
+				time.sleep(interval)
+				current = _snapshot(watched)
+				if current == snapshot: continue
+				
+				# Wait for a burst of changes to settle
+				settled = time.time()
+				while time.time() - settled < debounce:
+					time.sleep(min(interval, debounce))
+					latest = _snapshot(watched)
+					if latest != current: (current, settled) = (latest, time.time())
+				
+				inputs = _watch_inputs(self.inputs, watched, snapshot, current)
+				snapshot = current
+				if inputs is None: continue
+				
+				started = time.time()
+				try:
+					self.run_action(inputs)
+				except ActionCancelled:
+					raise
+				except Exception as e:
+					self.output_exception(e, started)
+		except KeyboardInterrupt:
+			if not self.inputs["quiet"]: print("", file=self.stdout)
 
-class InputDialog(tk.simpledialog._QueryString):
+class InputDialog(metaclass=_TkClass):
 	"""Dialog with only an Ok button."""
+	_tk_base = staticmethod(lambda: tk.simpledialog._QueryString)
+	
 	def buttonbox(self):
 		box = tk.Frame(self)
 		w = tk.Button(box, text="OK", width=10, command=self.ok, default=tk.ACTIVE)
@@ -388,12 +968,14 @@ class InputDialog(tk.simpledialog._QueryString):
 		self.bind("<Escape>", self.cancel)
 		box.pack()
 
-class BaseGUI(tk.Frame):
+class BaseGUI(metaclass=_TkClass):
 	"""Base class for defining the graphical user interface.
 	
 	Attributes:
 		prog - Program constants dictionary.
 		conf - Configuration dictionary.
+		configuration - BaseConfiguration object reloaded before each action, or None.
+		registry - Class ActionRegistry of the actions shown by create_actions, or None.
 		icon - Base-64 encoded string representing the icon.
 		menu - Dictionary defining the menu.
 		help - List of dictionaries defining the help.
@@ -402,22 +984,37 @@ class BaseGUI(tk.Frame):
 		padding - Padding to use for all widgets.
 		text_width - Width of text boxes.
 		last_update - Unix timestamp of last user progress update.
+		rate - ProgressRate object tracking the throughput of the action.
+		tasks - Dictionary of the running action's ProgressTask objects.
 		initialdirs - Last directory used for each initialdir passed to create_browse.
+		threaded - Flag to execute actions on a worker thread.
+		poll_interval - Milliseconds between checks of the worker thread's event queue.
+		events - Queue of events posted by the worker thread.
+		running - The BaseAction object currently executing, or None.
+		watch_interval - Milliseconds between checks of the watched files.
+		watch_debounce - Milliseconds without changes before performing the action on the watched files.
+		watching - Dictionary of the watched patterns, inputs and files, or None.
+		inputs - User input dictionary of the last action started by the user, as read from the widgets.
 	"""
 	
+	_tk_base = staticmethod(lambda: tk.Frame)
+	
+	registry = None
+	
 	def __init__(self, master, prog, conf):
 		"""Initialize the object.
 		
 		Parameters:
 			master - Tk Root object.
 			prog - Program constants dictionary.
-			conf - Configuration dictionary.
+			conf - Configuration dictionary, or BaseConfiguration object to reload it when its files change.
 		"""
 		tk.Frame.__init__(self, master)
 		self.grid(padx=10, pady=10)
 		
 		self.prog = prog
-		self.conf = conf
+		self.configuration = conf if isinstance(conf, BaseConfiguration) else None
+		self.conf = conf.conf if isinstance(conf, BaseConfiguration) else conf
 		self.icon = None
 		self.menu = {}
 		self.help = []
@@ -426,7 +1023,18 @@ class BaseGUI(tk.Frame):
 		self.padding = 4
 		self.text_width = 40
 		self.last_update = 0
+		self.rate = ProgressRate()
+		self.tasks = {}
 		self.initialdirs = {None:os.path.expanduser("~")}
+		self.threaded = False
+		self.poll_interval = 50
+		self.events = queue.Queue()
+		self.main_thread = threading.get_ident()
+		self.running = None
+		self.watch_interval = 2000
+		self.watch_debounce = 1000
+		self.watching = None
+		self.inputs = {}
 		
 		self.define_icon()
 		self.define_menu()
@@ -435,6 +1043,8 @@ class BaseGUI(tk.Frame):
 		self.create_widgets()
 		self.create_title(self.prog["name"])
 		self.create_progress()
+		self.create_tasks()
+		self.create_cancel()
 		self.set_defaults()
 		
 		self.start()
@@ -547,6 +1157,36 @@ class BaseGUI(tk.Frame):
 		self.set_icon(window)
 		self.center(window)
 	
+	def reload_config(self):
+		"""Reload the configuration if its files changed and update the widget defaults. Return True if it was reloaded."""
+		if (self.configuration is None) or (not self.configuration.reload()): return False
+		
+		previous = self.conf
+		self.conf = self.configuration.conf
+		self.update_defaults(previous)
+		return True
+	
+	def update_defaults(self, previous):
+		"""Update the default value of the widgets named after a configuration option, if it was the previous option value. Widgets still showing their default value show the new one.
+		
+		Parameters:
+			previous - Previous configuration dictionary.
+		"""
+		for (name, widget) in self.widgets.items():
+			if name not in self.conf: continue
+			
+			# Checkbox defaults are integers
+			(old, value) = (previous.get(name, widget.default), self.conf[name])
+			if isinstance(widget.default, int):
+				try:
+					(old, value) = (int(old), int(value))
+				except ValueError:
+					continue
+			if (old != widget.default) or (value == widget.default): continue
+			
+			if widget.getval() == widget.default: widget.setval(value)
+			widget.default = value
+	
 	def create_widgets(self):
 		"""Create the widgets."""
 		pass
@@ -684,7 +1324,7 @@ class BaseGUI(tk.Frame):
 		
 		parent.row += 1
 		
-	def create_listbox(self, parent, name, text, values, selectmode=tk.EXTENDED, largs={}, wargs={}, lgrid={}, wgrid={}):
+	def create_listbox(self, parent, name, text, values, selectmode="extended", largs={}, wargs={}, lgrid={}, wgrid={}):
 		"""Add a listbox to the given parent.
 		
 		Parameters:
@@ -863,7 +1503,7 @@ class BaseGUI(tk.Frame):
 			event - Tk event object.
 		"""
 		tab = event.widget.tab(event.widget.index("current"),"text")
-		event.widget.defaut = tab
+		event.widget.default = tab
 		event.widget.setval(tab)
 	
 	def create_tab(self, parent, text):
@@ -882,6 +1522,26 @@ class BaseGUI(tk.Frame):
 		
 		return tab
 	
+	def create_actions(self, parent):
+		"""Add a notebook named "action" with a tab for each action of the registry.
+		
+		Each tab contains the widgets created by the create_{name}_tab(tab) function, if it is defined, and a button performing the action. The actions are only imported when they are performed.
+		
+		Parameters:
+			parent - A Tk frame.
+		"""
+		notebook = self.create_notebook(parent, "action")
+		for (name, (text, target, desc)) in self.registry.actions.items():
+			tab = self.create_tab(notebook, text)
+			if desc != "": ttk.Label(tab, text=desc, padding=(0, 0, 0, 10)).grid(row=tab.row, column=0, columnspan=3, sticky="W")
+			tab.row += 1
+			
+			create = getattr(self, "create_{}_tab".format(name.replace("-", "_")), None)
+			if create is not None: create(tab)
+			self.create_button(tab, "{}-submit".format(name), text, self.action)
+		
+		return notebook
+	
 	def create_progress(self):
 		"""Add a progress label to the root window."""
 		value = tk.StringVar()
@@ -898,6 +1558,52 @@ class BaseGUI(tk.Frame):
 		
 		self.row += 1
 	
+	def create_tasks(self):
+		"""Add a table of the running tasks, shown while there are any, to the root window."""
+		self.task_table = ttk.Treeview(self, columns=("status",), height=5, selectmode="none")
+		self.task_table.heading("#0", text="Task")
+		self.task_table.heading("status", text="Progress")
+		self.task_table.column("#0", width=200, stretch=False)
+		self.task_table.column("status", width=350)
+		self.task_table.grid(row=self.row, column=0, columnspan=self.grid_size()[0], sticky="EW", pady=(10, 0))
+		self.task_table.grid_remove()
+		
+		self.row += 1
+	
+	def show_tasks(self, rows):
+		"""Show the rows in the task table, hiding it if there are none.
+		
+		Parameters:
+			rows - List of (name, status) tuples.
+		"""
+		self.task_table.delete(*self.task_table.get_children())
+		for (name, status) in rows: self.task_table.insert("", "end", text=name, values=(status,))
+		
+		if rows:
+			self.task_table.config(height=min(len(rows), 10))
+			self.task_table.grid()
+		else:
+			self.task_table.grid_remove()
+	
+	def task_rows(self):
+		"""Return a list of (name, status) tuples for the running tasks."""
+		return [(t.name, t.status()) for t in list(self.tasks.values())]
+	
+	def create_cancel(self):
+		"""Add a cancel button, shown while an action is running, to the root window."""
+		self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel)
+		self.cancel_button.grid(row=self.row, column=0, columnspan=self.grid_size()[0], pady=(10, 0))
+		self.cancel_button.grid_remove()
+		
+		self.row += 1
+	
+	def cancel(self):
+		"""Cancel the running action."""
+		if self.running is not None:
+			self.running.cancel()
+			self.cancel_button.config(state=tk.DISABLED)
+			self.widgets["progress"].setval("Cancelling...")
+	
 	def enable_widgets(self):
 		"""Enable all widgets."""
 		for name in self.widgets:
@@ -1042,7 +1748,7 @@ class BaseGUI(tk.Frame):
 		self.center(self.master)
 		self.mainloop()
 	
-	def set_progress(self, text, started=None, processed=None, total=None):
+	def set_progress(self, text, started=None, processed=None, total=None, processed_bytes=None, total_bytes=None):
 		"""Set the progress text.
 		
 		Parameters:
@@ -1050,11 +1756,17 @@ class BaseGUI(tk.Frame):
 			started - Unix timestamp of when the program started.
 			processed - Counter of processed items.
 			total - Total number of items to process.
+			processed_bytes - Counter of processed bytes.
+			total_bytes - Total number of bytes to process.
 		"""
-		p = progress(self.last_update, text, started, processed, total)
+		# Tk can't be used from other threads, i.e. a ProgressTracker's workers, while the main thread waits for them
+		if threading.get_ident() != self.main_thread: return
+		
+		p = progress(self.last_update, text, started, processed, total, processed_bytes, total_bytes, self.rate)
 		if p is not None:
 			self.last_update = p[0]
 			self.widgets["progress"].setval(p[1])
+			self.show_tasks(self.task_rows())
 			self.update()
 	
 	def user_message(self, message):
@@ -1103,152 +1815,2135 @@ class BaseGUI(tk.Frame):
 			if response is not None: return response
 	
 	def get_action(self, inputs):
-		"""Return the BaseAction subclass to use.
+		"""Return the BaseAction subclass to use, by default the action of the selected tab loaded from the registry.
 		
 		Parameters:
 			inputs - User input dictionary.
 		"""
-		pass
+		if self.registry is not None: return self.registry.load(inputs["action"])
 	
-	def action(self):
-		"""Validate the user's input and perform the action."""
+	def action(self, inputs=None):
+		"""Validate the user's input and perform the action.
+		
+		Parameters:
+			inputs - User input dictionary, or None to read it from the widgets.
+		"""
 		try:
 			self.config(cursor="watch")
 			self.disable_widgets()
 			
-			inputs = self.conf.copy()
-			for name in self.widgets: inputs[name] = self.widgets[name].getval()
+			if inputs is None:
+				# A new action from the user replaces any watch
+				self.watching = None
+				self.reload_config()
+				inputs = self.conf.copy()
+				for name in self.widgets: inputs[name] = self.widgets[name].getval()
+				inputs["_state"] = self.prog.get("state")
+				inputs["_cache"] = self.prog.get("cache")
+				self.inputs = inputs
+			
+			if self.threaded:
+				callbacks = (self.queue_progress, self.queued(self.user_message), self.queued(self.user_warning), self.queued(self.user_error), self.queued(self.user_confirm), self.queued(self.user_input))
+			else:
+				callbacks = (self.set_progress, self.user_message, self.user_warning, self.user_error, self.user_confirm, self.user_input)
 			
 			action = self.get_action(inputs)
 			try:
-				action = action(inputs, self.set_progress, self.user_message, self.user_warning, self.user_error, self.user_confirm, self.user_input, "gui")
+				# The action gets a copy, so its standardize() doesn't change the inputs of watch reruns
+				action = action(_copy_inputs(inputs), *callbacks, "gui")
 			except TypeError as e:
 				raise TypeError("{}.get_action must return a subclass of BaseAction, received: {}".format(self.__class__.__name__, action))
-			message = action.execute()
 			
-			self.config(cursor="")
-			tk.messagebox.showinfo("Success", message)
-			self.widgets["progress"].setval("")
+			# Offer to restart a failed run with the same inputs from its last checkpoint
+			saved = action.last_checkpoint()
+			if saved is not None:
+				action.inputs["resume"] = self.user_confirm("The last run with these inputs stopped after a checkpoint saved {}. Resume from the checkpoint?".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(saved)))) is True
+			
+			self.running = action
+			self.tasks = action.tasks
+			self.cancel_button.config(state=tk.NORMAL)
+			self.cancel_button.grid()
+			
+			if self.threaded:
+				self.start_worker(action)
+			elif action.is_async():
+				self.start_async(action)
+			else:
+				self.action_finished(action.execute())
 		except Exception as e:
+			self.action_finished(None, e)
+	
+	def action_finished(self, message, error=None):
+		"""Show the result of the action to the user and enable the widgets.
+		
+		Parameters:
+			message - Message returned by the action.
+			error - Exception raised by the action, or None.
+		"""
+		try:
+			action = self.running
+			self.running = None
+			self.tasks = {}
+			self.show_tasks([])
+			self.cancel_button.grid_remove()
 			self.config(cursor="")
 			self.widgets["progress"].setval("")
-			tk.messagebox.showerror("ERROR", str(e))
-			
-			error_output(e, self.prog["error"])
+			if (error is None) and (action is not None) and action.inputs.get("watch", False) and (action.watched or self.watching):
+				# Show the result without a dialog while watching
+				if self.watching is None: self.start_watch(action)
+				self.widgets["progress"].setval("{} | Watching for changes".format(message))
+			elif error is None:
+				tk.messagebox.showinfo("Success", message)
+			elif isinstance(error, ActionCancelled):
+				tk.messagebox.showinfo("Cancelled", str(error))
+			else:
+				tk.messagebox.showerror("ERROR", str(error))
+				error_output(error, self.prog["error"])
 		finally:
 			self.config(cursor="")
 			self.enable_widgets()
-
-class BaseAction:
-	"""Base class for defining actions.
 	
-	Attributes:
-		inputs - User input dictionary.
-		progress - Callback function for user progress updates.
-		user_message - Callback function for user messages.
-		user_warning - Callback function for user warnings.
-		user_error - Callback function for user errors.
-		user_confirm - Callback function for user confirmations.
-		user_input - Callback function for user input.
-		interface - Defines the interface used to execute the action.
-	"""
+	def create_watch(self, parent, text="Watch for changes", default=0):
+		"""Add a "watch" checkbox which keeps performing the action on changed or added input files while it is checked (see BaseCLI.watch).
+		
+		Parameters:
+			parent - A Tk frame.
+			text - Text for the checkbox.
+			default - Default value of the checkbox.
+		"""
+		self.create_checkbox(parent, "watch", text, default)
 	
-	def __init__(self, inputs, progress=None, user_message=None, user_warning=None, user_error=None, user_confirm=None, user_input=None, interface=None):
-		"""Initialize the object.
+	def start_watch(self, action):
+		"""Start polling the files found by the action's expand and iexpand calls.
 		
 		Parameters:
-			inputs - User input dictionary.
-			progress - Callback function for user progress updates.
-			user_message - Callback function for user messages.
-			user_warning - Callback function for user warnings.
-			user_error - Callback function for user errors.
-			user_confirm - Callback function for user confirmations.
-			user_input - Callback function for user input.
-			interface - Defines the interface used to execute the action.
+			action - A BaseAction object which succeeded.
 		"""
-		self.inputs = inputs
-		self.progress = progress if progress is not None else lambda *_: None
-		self.user_message = user_message if user_message is not None else lambda *_: None
-		self.user_warning = user_warning if user_warning is not None else lambda *_: None
-		self.user_error = user_error if user_error is not None else lambda *_: None
-		self.user_confirm = user_confirm if user_confirm is not None else lambda *_: None
-		self.user_input = user_input if user_input is not None else lambda *_: None
-		self.interface = interface
+		watched = dict(action.watched)
+		inputs = _copy_inputs(self.inputs)
+		for field in watched: inputs[field] = list(watched[field][0])
+		self.watching = {"watched": watched, "inputs": inputs, "snapshot": _snapshot(watched), "changed": None, "settled": 0}
+		self.after(self.watch_interval, self.poll_watch)
+	
+	def poll_watch(self):
+		"""Check the watched files and perform the action with the changed or added files once they haven't changed for watch_debounce milliseconds."""
+		watching = self.watching
+		if watching is None: return
+		if ("watch" in self.widgets) and not self.widgets["watch"].getval():
+			self.watching = None
+			self.widgets["progress"].setval("")
+			return
+		
+		if self.running is None:
+			current = _snapshot(watching["watched"])
+			now = time.time()
+			if current == watching["snapshot"]:
+				watching["changed"] = None
+			elif current != watching["changed"]:
+				(watching["changed"], watching["settled"]) = (current, now)
+			elif (now - watching["settled"]) * 1000 >= self.watch_debounce:
+				inputs = _watch_inputs(watching["inputs"], watching["watched"], watching["snapshot"], current)
+				(watching["snapshot"], watching["changed"]) = (current, None)
+				if inputs is not None: self.action(inputs)
+		
+		self.after(self.watch_interval, self.poll_watch)
 	
-	def standardize(self):
-		"""Standardize the user's inputs."""
-		pass
+	def start_worker(self, action):
+		"""Execute the action on a worker thread and start polling its event queue.
+		
+		Parameters:
+			action - A BaseAction object.
+		"""
+		def run():
+			try:
+				self.events.put(("finished", action.execute(), None))
+			except Exception as e:
+				self.events.put(("finished", None, e))
+		
+		threading.Thread(target=run, daemon=True).start()
+		self.after(self.poll_interval, self.poll_events)
 	
-	def validate(self):
+	def start_async(self, action):
+		"""Execute an async action on an asyncio event loop driven from the Tk event loop.
+		
+		Parameters:
+			action - A BaseAction object.
+		"""
+		import asyncio
+		
+		loop = asyncio.new_event_loop()
+		task = loop.create_task(action.execute_async())
+		
+		def step():
+			# A modal dialog opened by the action runs a nested Tk loop, try again later
+			if loop.is_running():
+				self.after(self.poll_interval, step)
+				return
+			
+			# Run the asyncio loop for a short time slice, then give control back to Tk
+			loop.call_later(0.01, loop.stop)
+			loop.run_forever()
+			
+			if task.done():
+				loop.close()
+				if task.cancelled(): self.action_finished(None, ActionCancelled("Cancelled by user"))
+				elif task.exception() is not None: self.action_finished(None, task.exception())
+				else: self.action_finished(task.result())
+			else:
+				self.after(1, step)
+		
+		self.after(1, step)
+	
+	def poll_events(self):
+		"""Process the events posted by the worker thread."""
+		text = None
+		rows = None
+		finished = None
+		while True:
+			try:
+				event = self.events.get_nowait()
+			except queue.Empty:
+				break
+			
+			if event[0] == "progress":
+				(_, text, rows) = event
+			elif event[0] == "call":
+				(_, function, args, kwargs, reply) = event
+				try:
+					reply.put((function(*args, **kwargs), None))
+				except Exception as e:
+					reply.put((None, e))
+			elif event[0] == "finished":
+				finished = event
+		
+		if text is not None:
+			self.widgets["progress"].setval(text)
+			self.show_tasks(rows)
+		
+		if finished is None:
+			self.after(self.poll_interval, self.poll_events)
+		else:
+			self.action_finished(finished[1], finished[2])
+	
+	def queue_progress(self, text, started=None, processed=None, total=None, processed_bytes=None, total_bytes=None):
+		"""Post the progress text from the worker thread.
+		
+		Parameters:
+			text - Progress text.
+			started - Unix timestamp of when the program started.
+			processed - Counter of processed items.
+			total - Total number of items to process.
+			processed_bytes - Counter of processed bytes.
+			total_bytes - Total number of bytes to process.
+		"""
+		p = progress(self.last_update, text, started, processed, total, processed_bytes, total_bytes, self.rate)
+		if p is not None:
+			self.last_update = p[0]
+			self.events.put(("progress", p[1], self.task_rows()))
+	
+	def queued(self, function):
+		"""Return a wrapper which calls the function on the main thread and waits for its result.
+		
+		Parameters:
+			function - Function to wrap.
+		"""
+		def wrapper(*args, **kwargs):
+			if threading.get_ident() == self.main_thread: return function(*args, **kwargs)
+			
+			reply = queue.Queue(maxsize=1)
+			self.events.put(("call", function, args, kwargs, reply))
+			(result, error) = reply.get()
+			if error is not None: raise error
+			return result
+		
+		return wrapper
+
+class BaseAction:
+	"""Base class for defining actions.
+	
+	Attributes:
+		inputs - User input dictionary.
+		progress - Callback function for user progress updates.
+		user_message - Callback function for user messages.
+		user_warning - Callback function for user warnings.
+		user_error - Callback function for user errors.
+		user_confirm - Callback function for user confirmations.
+		user_input - Callback function for user input.
+		interface - Defines the interface used to execute the action.
+		cancelled - Flag set when the user cancels the action.
+		files - File handles opened by open(), closed if the action fails or is cancelled.
+		outputs - AtomicOutput objects opened by create_output, committed when the action returns and discarded if it fails or is cancelled.
+		state - Dictionary of the size, modification time and hash of each input returned by changed, saved when the action succeeds.
+		key - Key identifying the action and its inputs in the state file, or None without a state file.
+		sizes - Dictionary of file sizes recorded by scan (None for STDIN).
+		total_files - Number of files recorded by scan.
+		total_bytes - Total size of the files recorded by scan.
+		tasks - Dictionary of the running ProgressTask objects, shown by the interface with the progress.
+		watched - Dictionary of {field: (patterns, recursive)} for the fields expanded by expand and iexpand, polled in watch mode. recursive is True for iexpand, where ** matches any number of directories.
+		checkpointed - Unix timestamp of the last checkpoint saved by the action, or None.
+		checkpoint_interval - Class minimum seconds between checkpoints.
+		cacheable - Class flag to cache the results of the action in the cache folder (prog["cache"]).
+		cache_files - Class tuple of the input fields which contain input filenames, part of the cache key.
+		cache_outputs - Class tuple of the input fields which contain output filenames, stored in the cache.
+		cache_size - Class maximum size in bytes of the cache folder.
+	"""
+	
+	checkpoint_interval = 30.0
+	cacheable = False
+	cache_files = ()
+	cache_outputs = ()
+	cache_size = 1073741824
+	
+	def __init__(self, inputs, progress=None, user_message=None, user_warning=None, user_error=None, user_confirm=None, user_input=None, interface=None):
+		"""Initialize the object.
+		
+		Parameters:
+			inputs - User input dictionary.
+			progress - Callback function for user progress updates.
+			user_message - Callback function for user messages.
+			user_warning - Callback function for user warnings.
+			user_error - Callback function for user errors.
+			user_confirm - Callback function for user confirmations.
+			user_input - Callback function for user input.
+			interface - Defines the interface used to execute the action.
+		"""
+		self.inputs = inputs
+		self.progress = self.cancellable(progress if progress is not None else lambda *_, **__: None)
+		self.user_message = user_message if user_message is not None else lambda *_: None
+		self.user_warning = user_warning if user_warning is not None else lambda *_: None
+		self.user_error = user_error if user_error is not None else lambda *_: None
+		self.user_confirm = user_confirm if user_confirm is not None else lambda *_: None
+		self.user_input = user_input if user_input is not None else lambda *_: None
+		self.interface = interface
+		self.cancelled = False
+		self.files = []
+		self.outputs = []
+		self.state = {}
+		self.key = self.state_key() if inputs.get("_state") is not None else None
+		self.checkpointed = None
+		self.checkpoint_due = 0
+		self.sizes = {}
+		self.total_files = 0
+		self.total_bytes = 0
+		self.tasks = {}
+		self.watched = {}
+	
+	def cancellable(self, function):
+		"""Return a wrapper which calls check_cancelled before calling the function.
+		
+		Parameters:
+			function - Function to wrap.
+		"""
+		def wrapper(*args, **kwargs):
+			self.check_cancelled()
+			return function(*args, **kwargs)
+		
+		return wrapper
+	
+	def cancel(self):
+		"""Request the action to stop at the next call to progress or check_cancelled."""
+		self.cancelled = True
+	
+	def check_cancelled(self):
+		"""Raise ActionCancelled if the user has cancelled the action."""
+		if self.cancelled: raise ActionCancelled("Cancelled by user")
+	
+	def close_files(self):
+		"""Close all file handles opened by open()."""
+		for f in self.files:
+			try:
+				f.close()
+			except Exception as e:
+				pass
+		self.files = []
+	
+	def close_outputs(self, commit=True):
+		"""Commit or discard all outputs opened by create_output which are still open.
+		
+		Parameters:
+			commit - Flag to commit the outputs, otherwise they are discarded.
+		"""
+		(outputs, self.outputs) = (self.outputs, [])
+		for output in outputs:
+			if commit: output.close()
+			else: output.discard()
+	
+	def standardize(self):
+		"""Standardize the user's inputs."""
+		pass
+	
+	def validate(self):
 		"""Raise an exception if any of the user's inputs are invalid."""
 		pass
 	
-	def action(self):
-		"""Perform the task and return a message for the user."""
-		return ""
+	def action(self):
+		"""Perform the task and return a message for the user."""
+		return ""
+	
+	def is_async(self):
+		"""Return True if any of standardize, validate or action is a coroutine function."""
+		import inspect
+		return any(inspect.iscoroutinefunction(f) for f in (self.standardize, self.validate, self.action))
+	
+	def execute(self):
+		"""Call standardize, validate and action. Return the result from action."""
+		if self.is_async():
+			import asyncio
+			return asyncio.run(self.execute_async())
+		
+		try:
+			self.standardize()
+			self.validate()
+			
+			# The key uses the standardized inputs, i.e. a default output set by standardize
+			key = self.cache_key()
+			if key is not None:
+				(hit, result) = self.cache_load(key)
+				if hit:
+					self.close_outputs(commit=False)
+					self.close_files()
+					return result
+			
+			result = self.action()
+			self.close_outputs()
+			self.save_state()
+			self.clear_checkpoint()
+			if key is not None: self.cache_store(key, result)
+			return result
+		except BaseException:
+			self.close_outputs(commit=False)
+			self.close_files()
+			raise
+	
+	async def execute_async(self):
+		"""Call standardize, validate and action, awaiting any coroutines. Return the result from action."""
+		import inspect
+		
+		try:
+			for f in (self.standardize, self.validate):
+				result = f()
+				if inspect.isawaitable(result): await result
+			
+			# The key uses the standardized inputs, i.e. a default output set by standardize
+			key = self.cache_key()
+			if key is not None:
+				(hit, result) = self.cache_load(key)
+				if hit:
+					self.close_outputs(commit=False)
+					self.close_files()
+					return result
+			
+			result = self.action()
+			if inspect.isawaitable(result): result = await result
+			self.close_outputs()
+			self.save_state()
+			self.clear_checkpoint()
+			if key is not None: self.cache_store(key, result)
+			return result
+		except BaseException:
+			self.close_outputs(commit=False)
+			self.close_files()
+			raise
+	
+	async def gather(self, function, items, limit=10, text="Processing"):
+		"""Await the coroutine function for each item, at most limit at a time, and return the results in order.
+		
+		Parameters:
+			function - Coroutine function taking one item.
+			items - An iterable of items.
+			limit - Maximum number of coroutines running at the same time.
+			text - Progress text.
+		"""
+		import asyncio
+		
+		total = len(items) if hasattr(items, "__len__") else None
+		items = enumerate(items)
+		results = {}
+		started = time.time()
+		processed = 0
+		
+		async def worker():
+			nonlocal processed
+			for (index, item) in items:
+				self.check_cancelled()
+				results[index] = await function(item)
+				processed += 1
+				self.progress(text, started, processed, total)
+		
+		self.progress(text, started, processed, total)
+		workers = [asyncio.ensure_future(worker()) for _ in range(limit)]
+		try:
+			await asyncio.gather(*workers)
+		except BaseException:
+			for w in workers: w.cancel()
+			raise
+		
+		return [results[i] for i in range(len(results))]
+	
+	def tracker(self, text="Processing", total=None, total_bytes=None, fps=10):
+		"""Return a ProgressTracker which reports to the progress callback, for progress from hot loops.
+		
+		Parameters:
+			text - Progress text.
+			total - Total number of items to process, or None.
+			total_bytes - Total number of bytes to process, or None to not track bytes.
+			fps - Number of updates per second.
+		"""
+		return ProgressTracker(self.progress, text, total, total_bytes, fps)
+	
+	def add_task(self, name, total=None, total_bytes=None):
+		"""Register and return a ProgressTask, shown as a row below the progress until it is closed.
+		
+		Parameters:
+			name - Task name, i.e. a filename.
+			total - Total number of items to process, or None.
+			total_bytes - Total number of bytes to process, or None.
+		"""
+		task = ProgressTask(name, total, total_bytes, self.tasks)
+		self.tasks[id(task)] = task
+		return task
+	
+	def get_workers(self):
+		"""Return the number of workers from the "workers" input, defaulting to the number of CPUs."""
+		workers = self.inputs.get("workers", "")
+		if (workers is None) or (workers == ""): return os.cpu_count() or 1
+		
+		try:
+			workers = int(workers)
+		except ValueError:
+			workers = 0
+		if workers < 1: raise ValueError("Invalid number of workers: {}".format(self.inputs["workers"]))
+		
+		return workers
+	
+	def parallel_map(self, function, items, workers=None, chunksize=1, threads=False, ordered=True, text="Processing"):
+		"""Call the function for each item on a pool of workers and yield the results.
+		
+		Parameters:
+			function - Function taking one item. Must be picklable (defined at module level) unless threads is True.
+			items - An iterable of items.
+			workers - Number of workers, defaults to get_workers().
+			chunksize - Number of items sent to a worker at a time.
+			threads - Flag to use a thread pool instead of a process pool, for I/O bound work.
+			ordered - Flag to yield the results in the order of the items, otherwise as they complete.
+			text - Progress text.
+		"""
+		import concurrent.futures
+		
+		if workers is None: workers = self.get_workers()
+		total = len(items) if hasattr(items, "__len__") else None
+		items = iter(items)
+		chunks = iter(lambda: list(itertools.islice(items, chunksize)), [])
+		
+		# Process workers ignore SIGINT, so Ctrl-C only cancels the action in this process
+		pool = concurrent.futures.ThreadPoolExecutor(workers) if threads else concurrent.futures.ProcessPoolExecutor(workers, initializer=_ignore_sigint)
+		try:
+			started = time.time()
+			processed = 0
+			self.progress(text, started, processed, total)
+			
+			pending = collections.deque(pool.submit(_map_chunk, function, c) for c in itertools.islice(chunks, workers * 2))
+			while pending:
+				if ordered:
+					future = pending.popleft()
+				else:
+					future = next(concurrent.futures.as_completed(pending))
+					pending.remove(future)
+				
+				results = future.result()
+				for c in itertools.islice(chunks, 1): pending.append(pool.submit(_map_chunk, function, c))
+				
+				processed += len(results)
+				self.progress(text, started, processed, total)
+				
+				yield from results
+		finally:
+			pool.shutdown(wait=False, cancel_futures=True)
+	
+	def parallel_file(self, function, filename, reducer=None, workers=None, size=None, sep=b"\n", threads=False, ordered=True, text="Processing"):
+		"""Split the file into ranges of whole records, call the function with the bytes of each range on a pool of workers, and return the list of results or the results combined by the reducer.
+		
+		Each worker reads its own range from the file, so only the results are sent back. Progress is reported with the number of processed bytes.
+		
+		Parameters:
+			function - Function taking the bytes of a range. Must be picklable (defined at module level) unless threads is True.
+			filename - An uncompressed filename.
+			reducer - Function taking the combined value and the next result and returning the new combined value, or None to return the list of results.
+			workers - Number of workers, defaults to get_workers().
+			size - Range size in bytes, defaults to a quarter of the file per worker between 1 MB and 64 MB.
+			sep - Record separator.
+			threads - Flag to use a thread pool instead of a process pool, for functions which release the GIL.
+			ordered - Flag to combine the results in the order of the ranges, otherwise as they complete.
+			text - Progress text.
+		"""
+		import concurrent.futures
+		import functools
+		
+		if (filename in ("STDIN", "STDOUT")) or (_compression(filename, filename) != "none"): raise ValueError("Can't split {} into ranges".format(filename))
+		
+		if workers is None: workers = self.get_workers()
+		total_bytes = os.path.getsize(filename)
+		if size is None: size = min(max(total_bytes // (workers * 4), 1048576), 67108864)
+		ranges = _file_ranges(filename, size, sep)
+		call = functools.partial(_map_range, function, filename)
+		
+		# Process workers ignore SIGINT, so Ctrl-C only cancels the action in this process
+		pool = concurrent.futures.ThreadPoolExecutor(workers) if threads else concurrent.futures.ProcessPoolExecutor(workers, initializer=_ignore_sigint)
+		try:
+			started = time.time()
+			(processed, processed_bytes) = (0, 0)
+			self.progress(text, started, processed, len(ranges), processed_bytes, total_bytes)
+			
+			todo = iter(ranges)
+			pending = collections.deque()
+			for (start, end) in itertools.islice(todo, workers * 2): pending.append((pool.submit(call, start, end), end - start))
+			
+			(results, value) = ([], None)
+			while pending:
+				if ordered:
+					(future, nbytes) = pending.popleft()
+				else:
+					future = next(concurrent.futures.as_completed([f for (f, _) in pending]))
+					(future, nbytes) = next(p for p in pending if p[0] is future)
+					pending.remove((future, nbytes))
+				
+				result = future.result()
+				for (start, end) in itertools.islice(todo, 1): pending.append((pool.submit(call, start, end), end - start))
+				
+				if reducer is None: results.append(result)
+				else: value = result if processed == 0 else reducer(value, result)
+				
+				processed += 1
+				processed_bytes += nbytes
+				self.progress(text, started, processed, len(ranges), processed_bytes, total_bytes)
+		finally:
+			pool.shutdown(wait=False, cancel_futures=True)
+		
+		return results if reducer is None else value
+	
+	def state_key(self):
+		"""Return a key identifying the action and its inputs in the state file, ignoring inputs which don't change the results (i.e. --workers). Called before the inputs are standardized or expanded."""
+		import hashlib
+		import json
+		
+		inputs = {k:v for (k, v) in self.inputs.items() if (not k.startswith("_")) and (k not in _STATE_IGNORED)}
+		key = json.dumps([self.__class__.__module__, self.__class__.__name__, inputs], sort_keys=True, default=str)
+		return hashlib.sha256(key.encode("utf-8")).hexdigest()
+	
+	def changed(self, files, hash=False):
+		"""Return the files which changed since the last successful run with the same inputs, or all of them with --full or without a state file (prog["state"]).
+		
+		A file is unchanged if its size and modification time are the same, or with hash its content is the same. The files are recorded as done in the state file only if the action succeeds.
+		
+		Parameters:
+			files - List of filenames, i.e. from expand.
+			hash - Flag to compare the content of files whose size or modification time changed.
+		"""
+		path = self.inputs.get("_state")
+		previous = {}
+		if (path is not None) and not self.inputs.get("full", False):
+			db = _open_state(path)
+			try:
+				previous = {row[0]:row[1:] for row in db.execute("SELECT path, size, mtime, hash FROM files WHERE job = ?", (self.key,))}
+			finally:
+				db.close()
+		
+		changed = []
+		for filename in files:
+			if filename == "STDIN":
+				changed.append(filename)
+				continue
+			
+			st = os.stat(filename)
+			(size, mtime, digest) = (st.st_size, st.st_mtime_ns, None)
+			old = previous.get(os.path.abspath(filename))
+			if (old is not None) and (old[0:2] == (size, mtime)):
+				digest = old[2]
+			else:
+				if hash: digest = _file_hash(filename)
+				if (old is None) or (digest is None) or (old[2] != digest): changed.append(filename)
+			
+			self.state[os.path.abspath(filename)] = (size, mtime, digest)
+		
+		return changed
+	
+	def save_state(self):
+		"""Record the files returned by changed as done in the state file. Called when the action succeeds."""
+		path = self.inputs.get("_state")
+		if (path is None) or not self.state: return
+		
+		db = _open_state(path)
+		try:
+			with db: db.executemany("INSERT OR REPLACE INTO files (job, path, size, mtime, hash) VALUES (?, ?, ?, ?, ?)", [(self.key, p) + v for (p, v) in self.state.items()])
+		finally:
+			db.close()
+		self.state = {}
+	
+	def checkpoint(self, state, force=False):
+		"""Save the state in the state file (prog["state"]) so a failed or cancelled run can be restarted with --resume, and return True if it was saved.
+		
+		Checkpoints are saved at most every checkpoint_interval seconds, so this can be called often. The state must be picklable and is saved in one transaction, so the last checkpoint is always complete. Does nothing without a state file.
+		
+		Parameters:
+			state - Object to save, i.e. a dictionary of counters and the last processed item.
+			force - Flag to save the state even if the interval hasn't passed.
+		"""
+		import pickle
+		
+		path = self.inputs.get("_state")
+		now = time.time()
+		if (path is None) or ((now < self.checkpoint_due) and not force): return False
+		
+		data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+		db = _open_state(path)
+		try:
+			with db: db.execute("INSERT OR REPLACE INTO checkpoints (job, saved, data) VALUES (?, ?, ?)", (self.key, now, data))
+		finally:
+			db.close()
+		
+		self.checkpointed = now
+		self.checkpoint_due = now + self.checkpoint_interval
+		return True
+	
+	def restore(self):
+		"""Return the state of the last checkpoint of a run with the same inputs if resuming (--resume), otherwise None."""
+		import pickle
+		
+		path = self.inputs.get("_state")
+		if (path is None) or not self.inputs.get("resume", False): return None
+		
+		db = _open_state(path)
+		try:
+			row = db.execute("SELECT saved, data FROM checkpoints WHERE job = ?", (self.key,)).fetchone()
+		finally:
+			db.close()
+		if row is None: return None
+		
+		if self.inputs.get("verbose", False): self.progress("Resuming from the checkpoint saved {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row[0]))))
+		return pickle.loads(row[1])
+	
+	def last_checkpoint(self):
+		"""Return the Unix timestamp of the last checkpoint of a run with the same inputs, or None."""
+		path = self.inputs.get("_state")
+		if path is None: return None
+		
+		db = _open_state(path)
+		try:
+			row = db.execute("SELECT saved FROM checkpoints WHERE job = ?", (self.key,)).fetchone()
+		finally:
+			db.close()
+		return row[0] if row is not None else None
+	
+	def clear_checkpoint(self):
+		"""Delete the checkpoint of runs with the same inputs. Called when the action succeeds."""
+		path = self.inputs.get("_state")
+		if path is None: return
+		
+		db = _open_state(path)
+		try:
+			with db: db.execute("DELETE FROM checkpoints WHERE job = ?", (self.key,))
+		finally:
+			db.close()
+		self.checkpointed = None
+	
+	def cache_key(self):
+		"""Return the key of the action's result in the cache, from its standardized inputs (except the outputs) and the size and modification time of its input files, or None if it can't be cached.
+		
+		Actions are cached if cacheable is True, the program has a cache folder and the inputs and outputs aren't STDIN or STDOUT. --full skips the cache.
+		"""
+		import hashlib
+		import json
+		
+		if (not self.cacheable) or (self.inputs.get("_cache") is None) or self.inputs.get("full", False): return None
+		
+		inputs = {k:v for (k, v) in self.inputs.items() if (not k.startswith("_")) and (k not in _STATE_IGNORED) and (k not in self.cache_outputs)}
+		files = []
+		for field in self.cache_files:
+			for filename in _cache_files(self.inputs[field]):
+				if filename == "STDIN": return None
+				try:
+					st = os.stat(filename)
+				except OSError:
+					# Leave missing inputs to validate
+					return None
+				files.append((os.path.abspath(filename), st.st_size, st.st_mtime_ns))
+		if any(self.inputs[field] in ("STDIN", "STDOUT") for field in self.cache_outputs): return None
+		
+		key = json.dumps([self.__class__.__module__, self.__class__.__name__, inputs, files], sort_keys=True, default=str)
+		return hashlib.sha256(key.encode("utf-8")).hexdigest()
+	
+	def cache_load(self, key):
+		"""Return (True, message) and copy the cached outputs to the output filenames if the key is in the cache, otherwise (False, None).
+		
+		Parameters:
+			key - Key from cache_key.
+		"""
+		import json
+		import shutil
+		
+		folder = os.path.join(self.inputs["_cache"], key)
+		try:
+			with open(os.path.join(folder, "result.json"), "r", encoding="utf-8") as f: result = json.load(f)
+		except (OSError, ValueError):
+			self.cache_stats("miss")
+			return (False, None)
+		
+		for (i, field) in enumerate(self.cache_outputs):
+			# Copy to a temporary file first, so a failed copy doesn't leave a partial output
+			temp = "{}.{}.tmp".format(self.inputs[field], os.getpid())
+			try:
+				shutil.copyfile(os.path.join(folder, str(i)), temp)
+				os.replace(temp, self.inputs[field])
+			except BaseException:
+				if os.path.exists(temp): os.remove(temp)
+				raise
+		os.utime(folder)
+		
+		self.cache_stats("hit")
+		return (True, result["message"])
+	
+	def cache_store(self, key, message):
+		"""Store the message and the output files in the cache, then remove the least recently used results over cache_size.
+		
+		Parameters:
+			key - Key from cache_key.
+			message - Message returned by the action.
+		"""
+		import json
+		import shutil
+		import tempfile
+		
+		try:
+			result = json.dumps({"message": message})
+		except (TypeError, ValueError):
+			# Only results which can be stored as JSON are cached
+			return
+		
+		cache = self.inputs["_cache"]
+		os.makedirs(cache, exist_ok=True)
+		temp = tempfile.mkdtemp(prefix=".", dir=cache)
+		try:
+			for (i, field) in enumerate(self.cache_outputs): shutil.copyfile(self.inputs[field], os.path.join(temp, str(i)))
+			with open(os.path.join(temp, "result.json"), "w", encoding="utf-8") as f: f.write(result)
+			os.rename(temp, os.path.join(cache, key))
+		except OSError:
+			# Another process stored the same result first, or the outputs can't be read
+			shutil.rmtree(temp, ignore_errors=True)
+			return
+		
+		_cache_evict(cache, self.cache_size)
+	
+	def cache_stats(self, event):
+		"""Count a cache hit or miss in the cache folder and show the totals with --verbose.
+		
+		Parameters:
+			event - "hit" or "miss".
+		"""
+		import json
+		
+		path = os.path.join(self.inputs["_cache"], "stats.json")
+		try:
+			with open(path, "r", encoding="utf-8") as f: stats = json.load(f)
+		except (OSError, ValueError):
+			stats = {"hit": 0, "miss": 0}
+		stats[event] = stats.get(event, 0) + 1
+		
+		try:
+			os.makedirs(self.inputs["_cache"], exist_ok=True)
+			with open(path, "w", encoding="utf-8") as f: json.dump(stats, f)
+		except OSError:
+			pass
+		
+		if self.inputs.get("verbose", False):
+			total = stats["hit"] + stats["miss"]
+			self.progress("Cache {} ({} hits, {} misses, {:.0f}% hit rate)\n".format(event, stats["hit"], stats["miss"], 100.0 * stats["hit"] / total))
+	
+	def expand(self, field, scan=False, changed=False):
+		"""Convert a CSV string into a list of filenames and expand wildcard filenames.
+		
+		Parameters:
+			field - Field name to modify.
+			scan - Flag to call scan on the expanded filenames.
+			changed - Flag to keep only the files which changed since the last successful run (see changed).
+		"""
+		if not isinstance(self.inputs[field], list): self.inputs[field] = list(csv.reader([self.inputs[field]]))[0]
+		self.watched.setdefault(field, (list(self.inputs[field]), False))
+		tmp = []
+		for i in self.inputs[field]:
+			if i == "STDIN":
+				tmp.append(i)
+			else:
+				for g in glob.glob(i): tmp.append(g)
+		self.inputs[field] = self.changed(tmp) if changed else tmp
+		
+		if scan: self.scan(field)
+	
+	def scan(self, field, workers=32):
+		"""Record the size of each file in the expanded field, using a thread pool to overlap the stat calls, and update sizes, total_files and total_bytes.
+		
+		Progress can then be weighted by size, i.e. self.progress(text, started, bytes_processed, self.total_bytes).
+		
+		Parameters:
+			field - Field name containing a list of filenames (see expand).
+			workers - Number of threads.
+		"""
+		files = [f for f in self.inputs[field] if f != "STDIN"]
+		if len(files) < len(self.inputs[field]): self.sizes["STDIN"] = None
+		
+		if files:
+			sizes = self.parallel_map(os.path.getsize, files, workers=min(workers, len(files)), chunksize=64, threads=True, text="Scanning")
+			self.sizes.update(zip(files, sizes))
+		
+		self.total_files = len(self.sizes)
+		self.total_bytes = sum(s for s in self.sizes.values() if s is not None)
+	
+	def iexpand(self, field, sort=False, follow_symlinks=True, unique=False):
+		"""Yield the filenames from a CSV string or list of filenames, expanding wildcard filenames while the directories are scanned.
+		
+		Unlike expand, the field isn't modified and the action can start on the first file before the scan is complete. Wildcards are the same as glob, with ** matching any number of directories.
+		
+		Parameters:
+			field - Field name to read.
+			sort - Flag to yield the files of each directory in sorted order.
+			follow_symlinks - Flag to descend into symbolic links to directories.
+			unique - Flag to skip files already yielded, identified by device and inode.
+		"""
+		patterns = self.inputs[field]
+		if not isinstance(patterns, list): patterns = list(csv.reader([patterns]))[0]
+		self.watched.setdefault(field, (list(patterns), True))
+		
+		yield from _expand(patterns, sort, follow_symlinks, unique)
+	
+	def open(self, filename, mode="r", encoding="utf-8", buffering=-1, compression="auto"):
+		"""Return sys.stdin (for filename == "STDIN"), sys.stdout (for filename == "STDOUT") or a file handle, decompressing or compressing the data if needed.
+		
+		With compression="auto" gzip, bz2 and xz/lzma files are recognized by their extension (.gz, .bz2, .xz, .lzma) or, when reading, by their first bytes. STDOUT is only compressed if the compression is given. Binary modes return the binary buffer of sys.stdin and sys.stdout.
+		
+		Parameters:
+			filename - "STDIN", "STDOUT" or a filename.
+			mode - File open mode.
+			encoding - File encoding, ignored for binary modes.
+			buffering - Buffer size in bytes, -1 for the default.
+			compression - "auto", "none", "gzip", "bz2" or "lzma".
+		"""
+		if self.inputs.get("verbose", False): self.progress("Opening {}\n".format(filename))
+		
+		binary = "b" in mode
+		if compression not in ("auto", "none", "gzip", "bz2", "lzma"): raise ValueError("Invalid compression: {}".format(compression))
+		
+		if filename == "STDIN":
+			if (sys.stdin is not None) and sys.stdin.isatty(): raise IOError("Empty STDIN")
+			if not hasattr(sys.stdin, "buffer"): return sys.stdin
+			if compression == "auto": compression = _compression(None, sys.stdin.buffer)
+			if compression == "none": return sys.stdin.buffer if binary else sys.stdin
+			f = sys.stdin.buffer
+		elif filename == "STDOUT":
+			if not hasattr(sys.stdout, "buffer"): return sys.stdout
+			if compression in ("auto", "none"):
+				if not binary: return sys.stdout
+				sys.stdout.flush()
+				return sys.stdout.buffer
+			sys.stdout.flush()
+			f = sys.stdout.buffer
+		else:
+			if compression == "auto": compression = _compression(filename, None if mode[0:1] != "r" else filename)
+			if compression == "none":
+				f = open(filename, mode=mode, buffering=buffering, encoding=None if binary else encoding)
+				compression = None
+			else:
+				f = filename
+		
+		if compression is not None:
+			# The compression module owns the file (or leaves the standard stream open), the buffer and text layers are added on top
+			module = importlib.import_module("gzip" if compression == "gzip" else compression)
+			f = module.open(f, mode.replace("t", "").replace("b", "") + "b")
+			if buffering > 1: f = io.BufferedReader(f, buffering) if mode[0:1] == "r" else io.BufferedWriter(f, buffering)
+			if not binary: f = io.TextIOWrapper(f, encoding=encoding)
+		
+		self.files = [h for h in self.files if not h.closed]
+		self.files.append(f)
+		return f
+	
+	def create_output(self, filename, mode="w", encoding="utf-8", buffering=1048576, background=False, compression="auto"):
+		"""Return an AtomicOutput which writes to a temporary file, renamed to filename when it is closed, so a failed or cancelled action never leaves a partial file.
+		
+		Use it as a context manager, or leave it open to be committed when the action returns and discarded if it fails or is cancelled.
+		
+		Parameters:
+			filename - "STDOUT" or a filename.
+			mode - "w" or "wb".
+			encoding - File encoding, ignored for binary modes.
+			buffering - Buffer size in bytes.
+			background - Flag to write the buffers to the file on a separate thread.
+			compression - "auto" (by extension), "none", "gzip", "bz2" or "lzma".
+		"""
+		if self.inputs.get("verbose", False): self.progress("Creating {}\n".format(filename))
+		
+		output = AtomicOutput(filename, mode, encoding, buffering, background, compression)
+		self.outputs = [o for o in self.outputs if not o.closed]
+		self.outputs.append(output)
+		return output
+	
+	def open_mmap(self, filename):
+		"""Return a read-only memory map of the file, closed by close_files.
+		
+		Raises ValueError for STDIN, STDOUT and empty files, which can't be mapped.
+		
+		Parameters:
+			filename - A filename.
+		"""
+		import mmap
+		
+		if filename in ("STDIN", "STDOUT"): raise ValueError("Can't memory map {}".format(filename))
+		if self.inputs.get("verbose", False): self.progress("Opening {}\n".format(filename))
+		
+		with open(filename, "rb") as f:
+			m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		if hasattr(mmap, "MADV_SEQUENTIAL"): m.madvise(mmap.MADV_SEQUENTIAL)
+		
+		self.files = [h for h in self.files if not h.closed]
+		self.files.append(m)
+		return m
+	
+	def iter_records(self, filename, sep=b"\n", buffering=1048576):
+		"""Yield the records of the file, without the separator, as memoryview slices which are not copied.
+		
+		Regular uncompressed files are memory mapped. STDIN, pipes, compressed and empty files are read in blocks through open, with the records sliced from each block. A record is only valid until the file is closed, convert it with bytes() to keep it.
+		
+		Parameters:
+			filename - "STDIN" or a filename.
+			sep - Record separator.
+			buffering - Block size in bytes for files which aren't memory mapped.
+		"""
+		if _mappable(filename):
+			m = self.open_mmap(filename)
+			view = memoryview(m)
+			try:
+				(start, find, step) = (0, m.find, len(sep))
+				while True:
+					end = find(sep, start)
+					if end < 0: break
+					yield view[start:end]
+					start = end + step
+				if start < len(m): yield view[start:]
+			finally:
+				view.release()
+				try:
+					m.close()
+				except BufferError:
+					# Records are still referenced, the map is closed when they are released or by close_files
+					pass
+		else:
+			f = self.open(filename, "rb", buffering=buffering)
+			try:
+				rest = b""
+				while True:
+					block = f.read1(buffering) if hasattr(f, "read1") else f.read(buffering)
+					if not block: break
+					block = rest + block if rest else block
+					view = memoryview(block)
+					start = 0
+					while True:
+						end = block.find(sep, start)
+						if end < 0: break
+						yield view[start:end]
+						start = end + len(sep)
+					rest = block[start:]
+				if rest: yield memoryview(rest)
+			finally:
+				if filename != "STDIN": f.close()
+	
+	def iter_blocks(self, filename, size=1048576, sep=b"\n"):
+		"""Yield the file in blocks of about size bytes which end after a separator, as memoryview slices which are not copied.
+		
+		Blocks only contain whole records, so they can be processed with bytes methods or regular expressions (i.e. counting or searching lines) without a Python loop per record. Files are read as in iter_records.
+		
+		Parameters:
+			filename - "STDIN" or a filename.
+			size - Block size in bytes.
+			sep - Record separator.
+		"""
+		if _mappable(filename):
+			m = self.open_mmap(filename)
+			view = memoryview(m)
+			try:
+				(start, length) = (0, len(m))
+				while start < length:
+					end = m.rfind(sep, start, start + size)
+					if end < 0: end = m.find(sep, start + size)
+					end = length if end < 0 else end + len(sep)
+					yield view[start:end]
+					start = end
+			finally:
+				view.release()
+				try:
+					m.close()
+				except BufferError:
+					pass
+		else:
+			f = self.open(filename, "rb", buffering=size)
+			try:
+				rest = b""
+				while True:
+					block = f.read(size)
+					if not block: break
+					block = rest + block if rest else block
+					end = block.rfind(sep)
+					if end < 0:
+						rest = block
+						continue
+					end += len(sep)
+					rest = block[end:]
+					yield memoryview(block)[0:end]
+				if rest: yield memoryview(rest)
+			finally:
+				if filename != "STDIN": f.close()
+
+class AtomicOutput:
+	"""Output file which is written to a temporary file in the same folder and renamed over the filename when it is closed (see BaseAction.create_output).
+	
+	The data goes through a large buffer and, optionally, a thread which makes the write system calls so they don't block the action. Closing flushes the buffers, waits for the thread, fsyncs the temporary file and renames it. STDOUT is written through the same buffers without the temporary file.
+	
+	Attributes:
+		filename - "STDOUT" or the filename.
+		temp - Temporary filename, or None for STDOUT.
+		closed - Flag set when the output is committed or discarded.
+		stream - File object the data is written to.
+		write - Write to the stream.
+		writelines - Write a list of lines to the stream.
+	"""
+	
+	def __init__(self, filename, mode="w", encoding="utf-8", buffering=1048576, background=False, compression="auto"):
+		"""Initialize the object.
+		
+		Parameters:
+			filename - "STDOUT" or a filename.
+			mode - "w" or "wb".
+			encoding - File encoding, ignored for binary modes.
+			buffering - Buffer size in bytes.
+			background - Flag to write the buffers to the file on a separate thread.
+			compression - "auto" (by extension), "none", "gzip", "bz2" or "lzma".
+		"""
+		import tempfile
+		
+		if mode.replace("t", "") not in ("w", "wb"): raise ValueError("Invalid output mode: {}".format(mode))
+		if compression not in ("auto", "none", "gzip", "bz2", "lzma"): raise ValueError("Invalid compression: {}".format(compression))
+		
+		self.filename = filename
+		self.temp = None
+		self.closed = False
+		self.background = None
+		self.compressor = None
+		self.text = None
+		
+		if filename == "STDOUT":
+			if compression == "auto": compression = "none"
+			sys.stdout.flush()
+			if not hasattr(sys.stdout, "buffer"):
+				# sys.stdout was replaced by a text stream, write to it directly
+				if ("b" in mode) or (compression != "none"): raise ValueError("Binary or compressed output needs sys.stdout.buffer")
+				self.target = self.buffer = self.stream = sys.stdout
+				self.write = self.stream.write
+				self.writelines = self.stream.writelines
+				return
+			self.target = sys.stdout.buffer
+		else:
+			if compression == "auto": compression = _compression(filename, None)
+			(folder, name) = os.path.split(os.path.abspath(filename))
+			(fd, self.temp) = tempfile.mkstemp(prefix=".{}.".format(name), suffix=".tmp", dir=folder)
+			try:
+				# Give the file the permissions of the file it replaces, or the default permissions
+				if os.path.exists(filename):
+					os.chmod(self.temp, os.stat(filename).st_mode & 0o7777)
+				else:
+					umask = os.umask(0)
+					os.umask(umask)
+					os.chmod(self.temp, 0o666 & ~umask)
+				self.target = open(fd, "wb", buffering=buffering if not background else -1)
+			except BaseException:
+				os.close(fd)
+				os.remove(self.temp)
+				raise
+		
+		if background:
+			self.background = _BackgroundWriter(self.target)
+			self.buffer = io.BufferedWriter(self.background, buffering)
+		elif self.temp is None:
+			self.buffer = io.BufferedWriter(_Unclosed(self.target), buffering)
+		else:
+			self.buffer = self.target
+		
+		self.stream = self.buffer
+		if compression != "none":
+			module = importlib.import_module(compression)
+			self.stream = self.compressor = module.open(self.stream, "wb")
+		if "b" not in mode:
+			self.stream = self.text = io.TextIOWrapper(self.stream, encoding=encoding)
+		
+		self.write = self.stream.write
+		self.writelines = self.stream.writelines
+	
+	def __getattr__(self, name):
+		return getattr(self.stream, name)
+	
+	def flush(self):
+		"""Flush the buffers to the file, without syncing it to disk."""
+		self.stream.flush()
+		if self.compressor is not None: self.buffer.flush()
+	
+	def close(self):
+		"""Flush the buffers, sync the temporary file to disk and rename it to the filename. The output is discarded if this fails."""
+		if self.closed: return
+		
+		try:
+			if self.text is not None:
+				self.text.flush()
+				self.text.detach()
+			if self.compressor is not None: self.compressor.close()
+			self.buffer.flush()
+			if self.background is not None: self.background.finish()
+			self.target.flush()
+			if self.temp is not None: os.fsync(self.target.fileno())
+		except BaseException:
+			self.discard()
+			raise
+		
+		self.closed = True
+		if self.temp is not None:
+			self.target.close()
+			os.replace(self.temp, self.filename)
+	
+	def discard(self):
+		"""Stop writing and delete the temporary file."""
+		if self.closed: return
+		self.closed = True
+		
+		if self.background is not None: self.background.finish(discard=True)
+		if self.temp is None:
+			# What was written to STDOUT can't be taken back, so don't leave it in the buffers
+			try:
+				if self.text is not None: self.text.detach()
+				self.buffer.flush()
+			except (OSError, ValueError):
+				pass
+		else:
+			try:
+				self.target.close()
+			except OSError:
+				pass
+			os.remove(self.temp)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None: self.close()
+		else: self.discard()
+
+class _Unclosed(io.RawIOBase):
+	"""Raw stream which writes to a file object without closing it, so buffers can be added to sys.stdout.buffer (see AtomicOutput)."""
+	
+	def __init__(self, target):
+		self.target = target
+	
+	def writable(self):
+		return True
+	
+	def write(self, b):
+		return self.target.write(b)
+
+class _BackgroundWriter(io.RawIOBase):
+	"""Raw stream which passes the data to a thread which writes it to a file object (see AtomicOutput).
+	
+	Write errors are raised by the next write or by finish.
+	"""
+	
+	def __init__(self, target, depth=4):
+		self.target = target
+		self.chunks = queue.Queue(depth)
+		self.error = None
+		self.discarding = False
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+	
+	def writable(self):
+		return True
+	
+	def write(self, b):
+		if self.error is not None: raise self.error
+		if self.discarding: raise ValueError("Write to a discarded output")
+		self.chunks.put(bytes(b))
+		return len(b)
+	
+	def run(self):
+		while True:
+			chunk = self.chunks.get()
+			if chunk is None: return
+			if (self.error is None) and not self.discarding:
+				try:
+					self.target.write(chunk)
+				except BaseException as e:
+					self.error = e
+	
+	def finish(self, discard=False):
+		"""Wait for the thread to write the queued data, or drop it if discard is True."""
+		if discard: self.discarding = True
+		if self.thread.is_alive():
+			self.chunks.put(None)
+			self.thread.join()
+		if (self.error is not None) and not discard: raise self.error
+
+class ArgumentSpec:
+	"""Immutable lookup tables of the command line arguments, compiled by BaseCLI.compile_arguments.
+	
+	Each argument is a tuple (long, short, description, type[, convert[, required]]) where type is "boolean", "value" or "multiple", convert is the type of the values (see BaseConfiguration.get) and required is a flag to reject a missing value.
 	
-	def execute(self):
-		"""Call standardize, validate and action. Return the result from action."""
-		self.standardize()
-		self.validate()
-		return self.action()
+	Attributes:
+		arguments - Tuple of the argument tuples.
+		short - Mapping of the short names to the long names.
+		types - Mapping of the long names to the argument types.
+		boolean - Frozenset of the boolean arguments.
+		value - Frozenset of the value arguments.
+		multiple - Frozenset of the multiple arguments.
+		converters - Mapping of the long names to the types of their values.
+		required - Tuple of the required arguments.
+	"""
 	
-	def expand(self, field):
-		"""Convert a CSV string into a list of filenames and expand wildcard filenames.
+	__slots__ = ("arguments", "short", "types", "boolean", "value", "multiple", "converters", "required")
+	
+	def __init__(self, arguments):
+		"""Initialize the object.
 		
 		Parameters:
-			field - Field name to modify.
+			arguments - List of argument tuples.
 		"""
-		if not isinstance(self.inputs[field], list): self.inputs[field] = list(csv.reader([self.inputs[field]]))[0]
-		tmp = []
-		for i in self.inputs[field]:
-			if i == "STDIN":
-				tmp.append(i)
-			else:
-				for g in glob.glob(i): tmp.append(g)
-		self.inputs[field] = tmp
+		import types
+		
+		short = {}
+		kinds = {}
+		converters = {}
+		required = []
+		for argument in arguments:
+			if not 4 <= len(argument) <= 6: raise ValueError("Invalid argument: {}".format(argument))
+			(long, letter, desc, type) = argument[:4]
+			convert = argument[4] if len(argument) > 4 else None
+			
+			if type not in ("boolean", "value", "multiple"): raise ValueError("Invalid argument type: {}".format(type))
+			if long in kinds: raise ValueError("Duplicate argument: --{}".format(long))
+			if letter in short: raise ValueError("Duplicate argument: -{}".format(letter))
+			if (convert is not None) and (type == "boolean"): raise ValueError("Boolean arguments can't be converted: --{}".format(long))
+			if (convert == "list") and (type == "multiple"): raise ValueError("Multiple arguments are already lists, use a value argument to split a list: --{}".format(long))
+			
+			kinds[long] = type
+			if letter != "": short[letter] = long
+			if convert is not None: converters[long] = tuple(convert) if isinstance(convert, list) else convert
+			if (len(argument) > 5) and argument[5]: required.append(long)
+		
+		object.__setattr__(self, "arguments", tuple(tuple(a) for a in arguments))
+		object.__setattr__(self, "short", types.MappingProxyType(short))
+		object.__setattr__(self, "types", types.MappingProxyType(kinds))
+		object.__setattr__(self, "boolean", frozenset(l for l in kinds if kinds[l] == "boolean"))
+		object.__setattr__(self, "value", frozenset(l for l in kinds if kinds[l] == "value"))
+		object.__setattr__(self, "multiple", frozenset(l for l in kinds if kinds[l] == "multiple"))
+		object.__setattr__(self, "converters", types.MappingProxyType(converters))
+		object.__setattr__(self, "required", tuple(required))
+	
+	def __setattr__(self, name, value):
+		"""Reject changes to the attributes."""
+		raise AttributeError("ArgumentSpec is immutable")
+
+class ActionRegistry:
+	"""Actions declared by name and imported on first use, used by BaseCLI and BaseGUI to generate the --action choices and the notebook tabs.
+	
+	Attributes:
+		actions - Dictionary of {name: (text, target, description)} in the order they were registered.
+		loaded - Dictionary of the BaseAction subclasses already loaded, by name.
+	"""
 	
-	def open(self, filename, mode="r", encoding="utf-8"):
-		"""Return sys.stdin (for filename == "STDIN"), sys.stdout (for filename == "STDIN") or a file handle.
+	def __init__(self):
+		"""Initialize the object."""
+		self.actions = {}
+		self.loaded = {}
+	
+	def register(self, name, target, text=None, description=""):
+		"""Declare an action.
 		
 		Parameters:
-			filename - "STDIN", "STDOUT" or a filename.
-			mode - File open mode.
-			encoding - File encoding.
+			name - Name of the action, used on the command line.
+			target - "module:Class" string of the BaseAction subclass, imported on first use, or the class itself.
+			text - Text of the GUI tab and button, defaults to the name.
+			description - Description shown in the help and on the GUI tab.
 		"""
-		if self.inputs.get("verbose", False): self.progress("Opening {}\n".format(filename))
+		if name in self.actions: raise KeyError("Duplicate action name: {}".format(name))
+		if isinstance(target, str) and (":" not in target): raise ValueError("Invalid action target, expected module:Class: {}".format(target))
 		
-		if filename == "STDIN":
-			if (sys.stdin is not None) and sys.stdin.isatty(): raise IOError("Empty STDIN")
-			return sys.stdin
-		elif filename == "STDOUT":
-			return sys.stdout
-		else:
-			return open(filename, mode=mode, encoding=encoding)
+		self.actions[name] = (name if text is None else text, target, description)
+		if not isinstance(target, str): self.loaded[name] = target
+	
+	def names(self):
+		"""Return the list of action names."""
+		return list(self.actions)
+	
+	def name(self, value):
+		"""Return the name of an action given its name or text.
+		
+		Parameters:
+			value - Name or text of the action.
+		"""
+		if value in self.actions: return value
+		for (name, (text, target, desc)) in self.actions.items():
+			if text == value: return name
+		raise ValueError("Unknown action: {}".format(value) if value not in ("", None) else "Action required")
+	
+	def load(self, value):
+		"""Return the BaseAction subclass of an action, importing its module on first use.
+		
+		Parameters:
+			value - Name or text of the action.
+		"""
+		name = self.name(value)
+		if name not in self.loaded:
+			(module, _, attribute) = self.actions[name][1].partition(":")
+			try:
+				action = importlib.import_module(module)
+				for a in attribute.split("."): action = getattr(action, a)
+			except (ImportError, AttributeError) as e:
+				raise ImportError("Can't load the {} action from {}: {}".format(name, self.actions[name][1], e))
+			self.loaded[name] = action
+		
+		return self.loaded[name]
+
+class ProgressTask:
+	"""Progress of one of several tasks running at the same time, i.e. one file per worker, shown as a row below the overall progress.
+	
+	Tasks are registered in BaseAction.tasks by add_task and retired by close, both of which are single dictionary operations so the interfaces can render a snapshot of the rows without locking.
+	
+	Attributes:
+		name - Task name.
+		started - Unix timestamp of when the task started.
+		processed - Counter of processed items.
+		total - Total number of items to process, or None.
+		processed_bytes - Counter of processed bytes, or None.
+		total_bytes - Total number of bytes to process, or None.
+		rate - ProgressRate object tracking the throughput of the task.
+		registry - Dictionary the task is registered in.
+	"""
+	
+	__slots__ = ("name", "started", "processed", "total", "processed_bytes", "total_bytes", "rate", "registry")
+	
+	def __init__(self, name, total=None, total_bytes=None, registry=None):
+		"""Initialize the object.
+		
+		Parameters:
+			name - Task name.
+			total - Total number of items to process, or None.
+			total_bytes - Total number of bytes to process, or None.
+			registry - Dictionary the task is registered in.
+		"""
+		self.name = name
+		self.started = time.time()
+		self.processed = 0
+		self.total = total
+		self.processed_bytes = 0 if total_bytes is not None else None
+		self.total_bytes = total_bytes
+		self.rate = ProgressRate()
+		self.registry = registry
+	
+	def add(self, items=1, nbytes=0):
+		"""Add to the counters.
+		
+		Parameters:
+			items - Number of items processed.
+			nbytes - Number of bytes processed.
+		"""
+		self.processed += items
+		if nbytes: self.processed_bytes = (self.processed_bytes or 0) + nbytes
+	
+	def status(self):
+		"""Return the time, progress and rates of the task formatted for display."""
+		return progress(0, "", self.started, self.processed, self.total, self.processed_bytes, self.total_bytes, self.rate)[1][3:]
+	
+	def close(self):
+		"""Retire the task from its registry."""
+		if self.registry is not None: self.registry.pop(id(self), None)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
 
-def progress(last_update, text, started=None, processed=None, total=None):
-	"""Return progress text with optional time elapsed and estimated time to complete.
+class ProgressRate:
+	"""Exponentially weighted throughput of an action, updated by progress().
+	
+	Attributes:
+		halflife - Seconds after which a change in speed has half of its effect on the rates.
+		started - Unix timestamp of when the program started, a new value resets the rates.
+		updated - Unix timestamp of the last update.
+		processed - Counter of processed items at the last update.
+		processed_bytes - Counter of processed bytes at the last update.
+		items - Items per second, or None if unknown.
+		bytes - Bytes per second, or None if unknown.
+	"""
+	
+	def __init__(self, halflife=5.0):
+		"""Initialize the object.
+		
+		Parameters:
+			halflife - Seconds after which a change in speed has half of its effect on the rates.
+		"""
+		self.halflife = halflife
+		self.started = None
+		self.updated = None
+		self.processed = None
+		self.processed_bytes = None
+		self.items = None
+		self.bytes = None
+	
+	def update(self, started, now, processed, processed_bytes):
+		"""Update the rates with the counters.
+		
+		Parameters:
+			started - Unix timestamp of when the program started.
+			now - Current Unix timestamp.
+			processed - Counter of processed items, or None.
+			processed_bytes - Counter of processed bytes, or None.
+		"""
+		if started != self.started:
+			(self.started, self.updated, self.items, self.bytes) = (started, started, None, None)
+			(self.processed, self.processed_bytes) = (0 if processed is not None else None, 0 if processed_bytes is not None else None)
+		
+		elapsed = now - self.updated
+		if elapsed <= 0: return
+		
+		# Start the averages with the first change, so the time before it isn't counted as zero throughput
+		if (self.items is None) and (self.bytes is None) and (processed == self.processed) and (processed_bytes == self.processed_bytes): return
+		
+		weight = 1.0 - math.pow(0.5, elapsed / self.halflife)
+		ewma = lambda average, value: value if average is None else average + weight * (value - average)
+		if (processed is not None) and (self.processed is not None): self.items = ewma(self.items, (processed - self.processed) / elapsed)
+		if (processed_bytes is not None) and (self.processed_bytes is not None): self.bytes = ewma(self.bytes, (processed_bytes - self.processed_bytes) / elapsed)
+		
+		(self.updated, self.processed, self.processed_bytes) = (now, processed, processed_bytes)
+	
+	def remaining(self, processed, total, processed_bytes, total_bytes):
+		"""Return the estimated seconds to complete, or None if unknown.
+		
+		Parameters:
+			processed - Counter of processed items.
+			total - Total number of items to process.
+			processed_bytes - Counter of processed bytes.
+			total_bytes - Total number of bytes to process.
+		"""
+		if (total_bytes is not None) and (processed_bytes is not None) and self.bytes: return max(total_bytes - processed_bytes, 0) / self.bytes
+		if (total is not None) and (processed is not None) and self.items: return max(total - processed, 0) / self.items
+		return None
+	
+	def text(self):
+		"""Return the rates formatted for display."""
+		text = ""
+		if self.items is not None: text += " | {:.1f}/s".format(self.items)
+		if self.bytes is not None: text += " | {}/s".format(format_bytes(self.bytes))
+		return text
+
+_get_ident = threading.get_ident
+
+class ProgressTracker:
+	"""Low overhead progress counters for hot loops.
+	
+	add() only updates a counter owned by the calling thread, so no lock is needed for counting. A timer thread marks an update as due at a fixed frame rate and the next add() calls the progress callback with the sum of the counters, so progress is shown while the thread which created the tracker waits for its workers. A non-blocking lock lets only one thread render at a time without making the others wait.
+	
+	The callback must be safe to call from the threads calling add(): BaseCLI prints the progress from any thread, BaseGUI.set_progress ignores calls from other threads because Tk only runs on the main thread. An ActionCancelled raised by the callback on another thread is ignored, so it is only raised on the thread which created the tracker.
+	
+	Attributes:
+		callback - Progress callback, i.e. BaseAction.progress.
+		text - Progress text.
+		started - Unix timestamp of when the tracker started.
+		total - Total number of items to process, or None.
+		total_bytes - Total number of bytes to process, or None.
+		interval - Seconds between updates.
+		due - Flag set by the timer when an update is due.
+		counters - Dictionary of [items, bytes] counters for each thread.
+	"""
+	
+	__slots__ = ("callback", "text", "started", "total", "total_bytes", "interval", "due", "counters", "_owner", "_lock", "_stop")
+	
+	def __init__(self, callback, text="Processing", total=None, total_bytes=None, fps=10):
+		"""Initialize the object and start the timer.
+		
+		Parameters:
+			callback - Progress callback, i.e. BaseAction.progress.
+			text - Progress text.
+			total - Total number of items to process, or None.
+			total_bytes - Total number of bytes to process, or None to not track bytes.
+			fps - Number of updates per second.
+		"""
+		self.callback = callback
+		self.text = text
+		self.started = time.time()
+		self.total = total
+		self.total_bytes = total_bytes
+		self.interval = 1.0 / fps
+		self.due = True
+		self.counters = {}
+		self._owner = threading.get_ident()
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		
+		threading.Thread(target=self._timer, daemon=True).start()
+	
+	def _timer(self):
+		while not self._stop.wait(self.interval): self.due = True
+	
+	@property
+	def processed(self):
+		"""Counter of processed items."""
+		return sum(c[0] for c in list(self.counters.values()))
+	
+	@property
+	def processed_bytes(self):
+		"""Counter of processed bytes."""
+		return sum(c[1] for c in list(self.counters.values()))
+	
+	def add(self, items=1, nbytes=0):
+		"""Add to the counters, and call the progress callback if an update is due.
+		
+		Parameters:
+			items - Number of items processed.
+			nbytes - Number of bytes processed.
+		"""
+		ident = _get_ident()
+		counter = self.counters.get(ident)
+		if counter is None: counter = self.counters.setdefault(ident, [0, 0])
+		counter[0] += items
+		counter[1] += nbytes
+		
+		# Threads finding another one rendering skip the update instead of waiting
+		if self.due and self._lock.acquire(False):
+			try:
+				if self.due: self._render()
+			except ActionCancelled:
+				# Workers keep going, the owner raises it on its next add() or close()
+				if ident == self._owner: raise
+			finally:
+				self._lock.release()
+	
+	def render(self):
+		"""Call the progress callback with the current counters."""
+		with self._lock: self._render()
+	
+	def _render(self):
+		self.due = False
+		if self.total_bytes is None: self.callback(self.text, self.started, self.processed, self.total)
+		else: self.callback(self.text, self.started, self.processed, self.total, processed_bytes=self.processed_bytes, total_bytes=self.total_bytes)
+	
+	def close(self):
+		"""Stop the timer and show the final counters."""
+		self._stop.set()
+		self.render()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None: self.close()
+		else: self._stop.set()
+
+def progress(last_update, text, started=None, processed=None, total=None, processed_bytes=None, total_bytes=None, rate=None, interval=100):
+	"""Return progress text with optional time elapsed, estimated time to complete and throughput.
+	
+	The estimate uses the bytes if total_bytes is given, otherwise the items. Without processed_bytes, total_bytes is ignored if total is given and processed_bytes counts as 0 otherwise. If neither total is known only the time elapsed and the counters are shown.
 	
 	Parameters:
 		text - Progress text.
 		started - Unix timestamp of when the program started.
 		processed - Counter of processed items.
 		total - Total number of items to process.
+		processed_bytes - Counter of processed bytes.
+		total_bytes - Total number of bytes to process.
+		rate - ProgressRate object for an estimate based on the recent throughput, and to show it.
+		interval - Minimum milliseconds between updates.
 	"""
+	if (total_bytes is not None) and (processed_bytes is None):
+		if total is not None: total_bytes = None
+		else: processed_bytes = 0
+	if (total is not None) and (processed is None): processed = 0
+	
 	now = time.time()
 	ms = int(round(now * 1000))
-	if ((ms - last_update) > 100) or (started is None) or (processed == total):
+	finished = (processed == total) if total_bytes is None else (processed_bytes == total_bytes)
+	if ((ms - last_update) > interval) or (started is None) or finished:
 		if started is not None:
+			hh_mm_ss = lambda t: "{}{:02d}:{:02d}".format("{}:".format(int(t/3600.0)) if t >= 3600 else "", int(t/60.0)%60, int(t%60))
 			elapsed = now - started
-			remaining = (0 if processed == 0 else (elapsed/processed)) * (total - processed)
+			if rate is not None: rate.update(started, now, processed, processed_bytes)
 			
-			hh_mm_ss = lambda t: "{}{:02d}:{:02d}".format("{}:".format(int(t/3600.0)) if t >= 3600 else "", int(t/60.0)%60, int(t%60))
-			text = "{} | Time: {}/{} | Progress {}%".format(text, hh_mm_ss(elapsed), hh_mm_ss(remaining), int((0 if total == 0 else (processed/total)) * 100.0))
+			if (total is None) and (total_bytes is None):
+				# Unknown total, no estimate possible
+				text = "{} | Time: {}".format(text, hh_mm_ss(elapsed))
+				if processed is not None: text += " | Processed {}".format(processed)
+				if processed_bytes is not None: text += " | {}".format(format_bytes(processed_bytes))
+			else:
+				(done, todo) = (processed, total) if total_bytes is None else (processed_bytes, total_bytes)
+				remaining = rate.remaining(processed, total, processed_bytes, total_bytes) if rate is not None else None
+				if remaining is None: remaining = (0 if done == 0 else (elapsed/done)) * (todo - done)
+				
+				text = "{} | Time: {}/{} | Progress {}%".format(text, hh_mm_ss(elapsed), hh_mm_ss(remaining), int((0 if todo == 0 else (done/todo)) * 100.0))
+			
+			if rate is not None: text += rate.text()
 		
 		return (ms, text)
 	else:
 		return None
 
+def format_bytes(size):
+	"""Return the size in bytes formatted for display, i.e. "1.5 MB".
+	
+	Parameters:
+		size - Number of bytes.
+	"""
+	for unit in ("B", "KB", "MB", "GB", "TB"):
+		if (abs(size) < 1024.0) or (unit == "TB"): break
+		size /= 1024.0
+	return "{:.0f} {}".format(size, unit) if unit == "B" else "{:.1f} {}".format(size, unit)
+
+def _file_key(path):
+	"""Return (device, inode) identifying the file, or the path if it can't be read.
+	
+	Parameters:
+		path - A filename.
+	"""
+	try:
+		st = os.stat(path)
+		return (st.st_dev, st.st_ino)
+	except OSError:
+		return path
+
+def _compression(filename, source):
+	"""Return the compression ("gzip", "bz2", "lzma" or "none") of a file from its extension or its first bytes (see BaseAction.open).
+	
+	Parameters:
+		filename - A filename, or None.
+		source - A filename or a binary file object with peek to read the first bytes from, or None.
+	"""
+	if filename is not None:
+		extension = os.path.splitext(filename)[1].lower()
+		if extension in (".gz", ".gzip"): return "gzip"
+		if extension == ".bz2": return "bz2"
+		if extension in (".xz", ".lzma"): return "lzma"
+	
+	if isinstance(source, str):
+		try:
+			with open(source, "rb") as f: magic = f.read(6)
+		except OSError:
+			# Leave the error to the caller's open
+			return "none"
+	elif hasattr(source, "peek"):
+		magic = source.peek(6)[0:6]
+	else:
+		return "none"
+	
+	if magic.startswith(b"\x1f\x8b"): return "gzip"
+	if magic.startswith(b"BZh"): return "bz2"
+	if magic.startswith(b"\xfd7zXZ\x00"): return "lzma"
+	return "none"
+
+def _mappable(filename):
+	"""Return True if the file is a regular, non-empty and uncompressed file which can be memory mapped (see BaseAction.iter_records).
+	
+	Parameters:
+		filename - "STDIN" or a filename.
+	"""
+	import stat
+	
+	if filename == "STDIN": return False
+	st = os.stat(filename)
+	return stat.S_ISREG(st.st_mode) and (st.st_size > 0) and (_compression(filename, filename) == "none")
+
+def _expand(patterns, sort=False, follow_symlinks=True, unique=False):
+	"""Yield the filenames matching a list of filenames and wildcards (see BaseAction.iexpand).
+	
+	Parameters:
+		patterns - List of filenames and wildcards.
+		sort - Flag to yield the files of each directory in sorted order.
+		follow_symlinks - Flag to descend into symbolic links to directories.
+		unique - Flag to skip files already yielded, identified by device and inode.
+	"""
+	seen = set()
+	for pattern in patterns:
+		if pattern == "STDIN":
+			yield pattern
+			continue
+		
+		# Split the pattern into a fixed directory and the parts containing wildcards
+		directory = pattern
+		parts = []
+		while glob.has_magic(directory):
+			(directory, part) = os.path.split(directory)
+			parts.insert(0, part)
+		
+		if not parts:
+			found = [(pattern, None)] if os.path.lexists(pattern) else []
+		else:
+			found = _scan(directory, parts, sort, follow_symlinks, frozenset())
+		
+		for (path, key) in found:
+			if unique:
+				if key is None: key = _file_key(path)
+				if key in seen: continue
+				seen.add(key)
+			yield path
+
+def _snapshot(watched):
+	"""Return a dictionary of {path: (size, modification time)} for the files matching the patterns of each field (see BaseCLI.watch).
+	
+	Parameters:
+		watched - Dictionary of {field: (list of filenames and wildcards, flag to expand them like iexpand rather than expand)}.
+	"""
+	import stat
+	
+	snapshot = {}
+	for (field, (patterns, recursive)) in watched.items():
+		files = snapshot[field] = {}
+		paths = _expand(patterns) if recursive else (g for p in patterns if p != "STDIN" for g in glob.glob(p))
+		for path in paths:
+			if path == "STDIN": continue
+			try:
+				st = os.stat(path)
+			except OSError:
+				continue
+			if not stat.S_ISDIR(st.st_mode): files[path] = (st.st_size, st.st_mtime_ns)
+	return snapshot
+
+def _copy_inputs(inputs):
+	"""Return a copy of the inputs, with copies of their lists.
+	
+	Parameters:
+		inputs - User input dictionary.
+	"""
+	return {k:(list(v) if isinstance(v, list) else v) for (k, v) in inputs.items()}
+
+def _watch_inputs(inputs, watched, previous, current):
+	"""Return a copy of the inputs with each watched field set to its changed or added files, or to its patterns if there are none, or None if no field has changed (see BaseCLI.watch).
+	
+	Parameters:
+		inputs - User input dictionary.
+		watched - Dictionary of {field: (list of filenames and wildcards, recursive flag)}.
+		previous - Snapshot of the files before the changes.
+		current - Snapshot of the files after the changes.
+	"""
+	inputs = _copy_inputs(inputs)
+	found = False
+	for field in watched:
+		changed = sorted(p for (p, v) in current[field].items() if previous[field].get(p) != v)
+		inputs[field] = changed if changed else list(watched[field][0])
+		found = found or bool(changed)
+	return inputs if found else None
+
+def _scan(directory, parts, sort, follow_symlinks, active):
+	"""Yield (path, key) for the paths below directory which match the pattern parts (see BaseAction.iexpand).
+	
+	The key is (device, inode), or None for symbolic links which must be resolved by _file_key.
+	
+	Parameters:
+		directory - Directory to scan ("" for the current directory).
+		parts - List of the remaining pattern parts.
+		sort - Flag to yield the entries in sorted order.
+		follow_symlinks - Flag to descend into symbolic links to directories.
+		active - Set of (device, inode) of the directories being scanned, to avoid symbolic link loops.
+	"""
+	(part, rest) = (parts[0], parts[1:])
+	
+	try:
+		st = os.stat(directory or ".")
+		if (st.st_dev, st.st_ino) in active: return
+		with os.scandir(directory or ".") as it:
+			entries = sorted(it, key=lambda e: e.name) if sort else list(it)
+	except OSError:
+		return
+	
+	scanning = active | {(st.st_dev, st.st_ino)}
+	
+	def key(entry):
+		return None if entry.is_symlink() else (st.st_dev, entry.inode())
+	
+	def is_dir(entry):
+		try:
+			return entry.is_dir(follow_symlinks=follow_symlinks)
+		except OSError:
+			return False
+	
+	if part == "**":
+		# Match zero directories, then every sub-directory
+		if rest: yield from _scan(directory, rest, sort, follow_symlinks, active)
+		for entry in entries:
+			if entry.name.startswith("."): continue
+			path = os.path.join(directory, entry.name)
+			if not rest: yield (path, key(entry))
+			if is_dir(entry): yield from _scan(path, parts, sort, follow_symlinks, scanning)
+	elif part == "":
+		# Pattern ending with a separator only matches directories
+		if directory != "": yield (os.path.join(directory, ""), (st.st_dev, st.st_ino))
+	else:
+		hidden = part.startswith(".")
+		for entry in entries:
+			if entry.name.startswith(".") and not hidden: continue
+			if not fnmatch.fnmatch(entry.name, part): continue
+			path = os.path.join(directory, entry.name)
+			if not rest: yield (path, key(entry))
+			elif is_dir(entry): yield from _scan(path, rest, sort, follow_symlinks, scanning)
+
+def _ignore_sigint():
+	"""Ignore SIGINT in a worker process (see BaseAction.parallel_map)."""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _map_chunk(function, chunk):
+	"""Return the results of calling the function for each item in the chunk (see BaseAction.parallel_map).
+	
+	Parameters:
+		function - Function taking one item.
+		chunk - List of items.
+	"""
+	return [function(i) for i in chunk]
+
+def _file_ranges(filename, size, sep):
+	"""Return a list of (start, end) byte ranges of about size bytes which end after a separator (see BaseAction.parallel_file).
+	
+	Parameters:
+		filename - A filename.
+		size - Range size in bytes.
+		sep - Record separator.
+	"""
+	import mmap
+	
+	ranges = []
+	with open(filename, "rb") as f:
+		length = os.fstat(f.fileno()).st_size
+		if length == 0: return ranges
+		
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+			start = 0
+			while start < length:
+				end = m.find(sep, max(start + size - len(sep) + 1, start))
+				end = length if end < 0 else end + len(sep)
+				ranges.append((start, end))
+				start = end
+	
+	return ranges
+
+def _map_range(function, filename, start, end):
+	"""Return the result of calling the function with the bytes of a range of the file (see BaseAction.parallel_file).
+	
+	Parameters:
+		function - Function taking the bytes of a range.
+		filename - A filename.
+		start - Offset of the first byte.
+		end - Offset after the last byte.
+	"""
+	with open(filename, "rb") as f:
+		f.seek(start)
+		return function(f.read(end - start))
+
+_STATE_IGNORED = ("help", "version", "license", "quiet", "verbose", "workers", "batch", "serve", "connect", "progress-format", "progress-fd", "full", "resume", "watch", "watch-interval", "watch-debounce")
+
+def _open_state(path):
+	"""Return a connection to the state file, creating it if needed (see BaseAction.changed).
+	
+	Parameters:
+		path - State filename.
+	"""
+	import sqlite3
+	
+	db = sqlite3.connect(path, timeout=60)
+	db.execute("CREATE TABLE IF NOT EXISTS files (job TEXT, path TEXT, size INTEGER, mtime INTEGER, hash TEXT, PRIMARY KEY (job, path))")
+	db.execute("CREATE TABLE IF NOT EXISTS checkpoints (job TEXT PRIMARY KEY, saved REAL, data BLOB)")
+	return db
+
+def _file_hash(filename):
+	"""Return the SHA-256 digest of the file's content.
+	
+	Parameters:
+		filename - A filename.
+	"""
+	import hashlib
+	
+	digest = hashlib.sha256()
+	with open(filename, "rb") as f:
+		for block in iter(lambda: f.read(1048576), b""): digest.update(block)
+	return digest.hexdigest()
+
+def _cache_files(value):
+	"""Return the filenames in an input field, a list or a CSV string of filenames and wildcards (see BaseAction.cache_key).
+	
+	Parameters:
+		value - Input value.
+	"""
+	if not isinstance(value, list): value = list(csv.reader([value]))[0] if value != "" else []
+	files = []
+	for i in value:
+		if i == "STDIN": files.append(i)
+		else: files += sorted(glob.glob(i))
+	return files
+
+def _cache_evict(cache, size):
+	"""Remove the least recently used results from the cache folder until its size is at most size bytes (see BaseAction.cache_store).
+	
+	Parameters:
+		cache - Cache folder.
+		size - Maximum size in bytes.
+	"""
+	import shutil
+	
+	entries = []
+	with os.scandir(cache) as it:
+		for entry in it:
+			if (not entry.is_dir(follow_symlinks=False)) or entry.name.startswith("."): continue
+			with os.scandir(entry.path) as files: used = sum(f.stat().st_size for f in files)
+			entries.append((entry.stat().st_mtime, used, entry.path))
+	
+	total = sum(e[1] for e in entries)
+	for (_, used, path) in sorted(entries):
+		if total <= size: break
+		shutil.rmtree(path, ignore_errors=True)
+		total -= used
+
+_BOOLEANS = {"1":True, "yes":True, "true":True, "on":True, "0":False, "no":False, "false":False, "off":False}
+
+def _convert(value, type, name):
+	"""Return the string converted to the type (see BaseConfiguration.get), or raise a ValueError naming the option. Other values are returned unchanged.
+	
+	Parameters:
+		value - String to convert.
+		type - str, int, float, bool, "path", "list", a tuple of the allowed values or a function converting the string.
+		name - Name of the option or argument for the error message.
+	"""
+	if not isinstance(value, str): return value
+	
+	try:
+		if isinstance(type, (tuple, list, set, frozenset)):
+			if value not in type: raise ValueError("expected one of: {}".format(", ".join(str(t) for t in type)))
+		elif type is bool:
+			if value.lower() not in _BOOLEANS: raise ValueError("expected yes or no")
+			value = _BOOLEANS[value.lower()]
+		elif type == "path":
+			value = os.path.expanduser(value)
+		elif type == "list":
+			value = [v.strip() for v in value.split(",") if v.strip() != ""]
+		else:
+			value = type(value)
+	except ValueError as e:
+		raise ValueError("Invalid value for {}: {} ({})".format(name, value, e))
+	
+	return value
+
+_argument_specs = {}
+
+def _positive_int(value):
+	"""Return the string converted to an integer of at least 1 (see BaseCLI.define_standard_arguments).
+	
+	Parameters:
+		value - String to convert.
+	"""
+	value = int(value)
+	if value < 1: raise ValueError("must be at least 1")
+	return value
+
+def _wrap(text, width):
+	"""Return the text with its words wrapped on lines of at most width characters.
+	
+	Parameters:
+		text - Text to wrap.
+		width - Maximum line length.
+	"""
+	lines = [""]
+	for word in text.split():
+		if (lines[-1] != "") and (len(lines[-1]) + 1 + len(word) > width): lines.append("")
+		lines[-1] += (" " if lines[-1] != "" else "") + word
+	return "\n".join(lines)
+
+_config_cache = {}
+
+def _read_config(files, cache_path=None):
+	"""Return a list of (section, options) lists, one for each configuration file (empty for missing files), using the parsed files cached by filename, modification time and size (see BaseConfiguration.load).
+	
+	The cache is kept in memory and, if cache_path is given, in a marshal file so programs started often don't need to import configparser.
+	
+	Parameters:
+		files - List of (filename, required) tuples.
+		cache_path - Filename of the cache, or None.
+	"""
+	import marshal
+	
+	if (cache_path is not None) and (cache_path not in _config_cache):
+		try:
+			with open(cache_path, "rb") as f: _config_cache[cache_path] = marshal.load(f)
+		except (OSError, EOFError, ValueError, TypeError):
+			_config_cache[cache_path] = {}
+	cache = _config_cache.setdefault(cache_path, {})
+	
+	result = []
+	changed = False
+	for (filename, required) in files:
+		try:
+			st = os.stat(filename)
+		except OSError:
+			if required: raise
+			result.append([])
+			continue
+		
+		stamp = (st.st_mtime_ns, st.st_size)
+		entry = cache.get(filename)
+		if (entry is None) or (tuple(entry[0]) != stamp):
+			cp = configparser.ConfigParser()
+			with open(filename, "r") as f: cp.read_file(f)
+			defaults = cp.defaults()
+			parsed = [("DEFAULT", dict(defaults))]
+			for s in cp.sections():
+				# Keep only the options set in the section, so DEFAULT values from later layers still apply
+				parsed.append((s, {o:cp.get(s, o) for o in cp.options(s) if (o not in defaults) or (cp.get(s, o, raw=True) != defaults[o])}))
+			entry = cache[filename] = (stamp, parsed)
+			changed = True
+		
+		result.append([(s, dict(o)) for (s, o) in entry[1]])
+	
+	if changed and (cache_path is not None):
+		try:
+			temp = "{}.{}.tmp".format(cache_path, os.getpid())
+			with open(temp, "wb") as f: marshal.dump(cache, f)
+			os.replace(temp, cache_path)
+		except OSError:
+			pass
+	
+	return result
+
+def _run_job(action_class, inputs):
+	"""Execute an action without user interaction and return (success, message, seconds, error details or None) (see BaseCLI.run_batch).
+	
+	Parameters:
+		action_class - A BaseAction subclass.
+		inputs - User input dictionary.
+	"""
+	import traceback
+	
+	started = time.time()
+	try:
+		return (True, action_class(inputs, interface="cli").execute(), time.time() - started, None)
+	except Exception as e:
+		return (False, str(e), time.time() - started, "".join(traceback.format_exception(type(e), e, e.__traceback__)))
+
+def _write_error(details, error_path):
+	"""Write formatted error details to a file, or print them if it can't be written (see error_output).
+	
+	Parameters:
+		details - Formatted traceback.
+		error_path - Error filename or None.
+	"""
+	if error_path is not None:
+		try:
+			with open(error_path, mode="w") as f: f.write(details)
+		except Exception as e:
+			print(details)
+
 def setdefaults(primary, secondary):
 	"""Return a dictionary with the values of primary and secondary merged, with primary taking precedence over secondary.
 	
@@ -1269,14 +3964,33 @@ def error_output(ex, error_path):
 	"""
 	import traceback
 	
-	if error_path is not None:
+	if error_path is not None: _write_error("".join(traceback.format_exception(type(ex), ex, ex.__traceback__)), error_path)
+
+def connect(path, argv, stdout=None):
+	"""Send a job to a server started with --serve and copy its output to stdout.
+	
+	Parameters:
+		path - Socket filename.
+		argv - Command line arguments for the job.
+		stdout - File object for the output, defaults to sys.stdout.
+	"""
+	import json
+	import socket
+	
+	if stdout is None: stdout = sys.stdout
+	
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
 		try:
-			with open(error_path, mode="w") as f: f.write(traceback.format_exc())
-		except Exception as e:
-			print(traceback.format_exc())
+			client.connect(path)
+		except OSError as e:
+			raise ConnectionError("Can't connect to the server on {}: {}".format(path, e.strerror if e.strerror else e))
+		client.sendall((json.dumps(list(argv)) + "\n").encode("utf-8"))
+		for text in client.makefile("r", encoding="utf-8", newline=""):
+			stdout.write(text)
+			stdout.flush()
 
 def main(prog, configuration_class, cli_class, gui_class):
-	"""Run the program.
+	"""Run the program. Exit with status 1 if the program can't start or the job can't be sent to the server.
 	
 	Parameters:
 		prog - Program constants dictionary.
@@ -1288,10 +4002,21 @@ def main(prog, configuration_class, cli_class, gui_class):
 	path += os.sep
 	if prog["config"] is not None: prog["config"] = prog["config"].format(path=path)
 	if prog["error"]  is not None: prog["error"]  = prog["error"].format(path=path)
+	if prog.get("state") is not None: prog["state"] = prog["state"].format(path=path)
+	if prog.get("cache") is not None: prog["cache"] = prog["cache"].format(path=path)
+	if prog.get("config-cache") is not None: prog["config-cache"] = prog["config-cache"].format(path=path)
 	
 	try:
 		if (cli_class is not None) and ("gui" not in sys.argv) and ((len(sys.argv) > 1) or ((sys.stdin is not None) and not sys.stdin.isatty())):
 			try:
+				# Send the job to a server (see BaseCLI.serve) without loading the configuration
+				argv = sys.argv[1:]
+				for (i, val) in enumerate(argv):
+					if val.startswith("--connect="):
+						return connect(val[10:], argv[:i] + argv[i+1:])
+					elif (val == "--connect") and (i + 1 < len(argv)):
+						return connect(argv[i+1], argv[:i] + argv[i+2:])
+				
 				conf = configuration_class(prog).conf if configuration_class is not None else {}
 				cli = cli_class(prog, conf, sys.argv)
 			except Exception as e:
@@ -1300,7 +4025,7 @@ def main(prog, configuration_class, cli_class, gui_class):
 		elif (gui_class is not None):
 			root = tk.Tk()
 			try:
-				conf = configuration_class(prog).conf if configuration_class is not None else {}
+				conf = configuration_class(prog) if configuration_class is not None else {}
 				gui = gui_class(root, prog, conf)
 			except Exception as e:
 				root.withdraw()
@@ -1310,3 +4035,4 @@ def main(prog, configuration_class, cli_class, gui_class):
 			print("\nERROR:\nNo UI defined.\n")
 	except Exception as e:
 		error_output(e, prog["error"])
+		sys.exit(1)